@@ -0,0 +1,656 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the Whisper daemon
+
+Runs the real daemon in a child process against stand-ins for everything
+that needs hardware or a desktop session: a fake sounddevice that plays a
+WAV fixture (or synthetic speech) in real time, stub whisper-cli and
+whisper-server executables that sleep in proportion to the audio they get,
+and a stub wtype. Works on a plain Linux box with no GPU, audio device or
+Wayland session.
+
+Measures, per mode (cli/server):
+  - Time from launch to the daemon's first IPC reply
+  - IPC round-trip for plain-text and pipelined JSON requests
+  - STOP-to-typed latency, as seen by a subscribed client
+  - Throughput for back-to-back dictations
+  - The daemon's memory high-water mark (VmHWM)
+
+Results are written as JSON; --compare checks them against a saved
+baseline and exits non-zero on regressions.
+
+Usage:
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+TERMINAL_EVENTS = ("typed", "no_speech", "cancelled", "error")
+HEARD = re.compile(r"\((\d+\.\d+)s\)")  # Audio length the stubs append to their text
+STARTUP_TIMEOUT = 30  # Seconds to wait for the daemon (and stub servers) to come up
+EVENT_TIMEOUT = 30  # Seconds to wait for a dictation to finish
+
+# Regression checks: (metric path, higher is better, absolute slack)
+CHECKS = (
+    (("first_reply_ms",), False, 20.0),
+    (("ipc_plain_ms", "p50"), False, 1.0),
+    (("ipc_pipelined_ms", "p50"), False, 0.5),
+    (("stop_to_typed_ms", "p50"), False, 20.0),
+    (("stop_to_typed_ms", "p90"), False, 30.0),
+    (("throughput_per_min",), True, 1.0),
+    (("peak_rss_mb",), False, 5.0),
+)
+
+STUB_CLI = """#!{python}
+# Stub whisper-cli: "loads" the model, then runs at a fixed real-time factor
+import os, sys, time, wave
+args = sys.argv[1:]
+with wave.open(args[args.index("-f") + 1]) as wav:
+    seconds = wav.getnframes() / wav.getframerate()
+time.sleep(float(os.environ["BENCH_LOAD_DELAY"]) + seconds * float(os.environ["BENCH_RTF"]))
+print(f"{{os.environ['BENCH_TEXT']}} ({{seconds:.2f}}s)")
+"""
+
+STUB_SERVER = """#!{python}
+# Stub whisper-server: answers /inference at a fixed real-time factor
+import os, sys, json, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+port = int(sys.argv[sys.argv.index("--port") + 1])
+time.sleep(float(os.environ["BENCH_LOAD_DELAY"]))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(b"{{}}")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        # Raw 16 kHz int16 samples follow the multipart and WAV headers
+        seconds = max(0, len(body) - 300) / 32000
+        time.sleep(seconds * float(os.environ["BENCH_RTF"]))
+        text = f"{{os.environ['BENCH_TEXT']}} ({{seconds:.2f}}s)"
+        self._send(json.dumps({{"text": text}}).encode())
+
+
+ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+"""
+
+STUB_WTYPE = """#!/bin/sh
+cat > /dev/null
+"""
+
+
+# --- Daemon side (runs in the child process) ---
+
+
+def synthetic_speech(sample_rate=16000, seconds=30, seed=0):
+    """Syllable-like voiced bursts with pauses, over a low noise floor"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, 30, int(seconds * sample_rate))
+    position = int(0.3 * sample_rate)
+    while position < len(audio):
+        for _ in range(rng.integers(2, 6)):  # Syllables in a word
+            if position >= len(audio):
+                break
+            length = int(rng.uniform(0.12, 0.25) * sample_rate)
+            t = np.arange(length) / sample_rate
+            f0 = rng.uniform(110, 180)
+            voiced = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+            envelope = np.sin(np.pi * np.arange(length) / length)
+            end = min(len(audio), position + length)
+            audio[position:end] += (4000 * voiced * envelope)[: end - position]
+            position += length + int(rng.uniform(0.03, 0.08) * sample_rate)
+        position += int(rng.uniform(0.15, 0.5) * sample_rate)  # Between words
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+
+def fake_sounddevice(source):
+    """A stand-in sounddevice module
+
+    Input streams play source.load() in a loop; output is discarded. numpy
+    and the fixture are only loaded after startup, by run_daemon or the
+    first input stream.
+    """
+    module = types.ModuleType("sounddevice")
+
+    def converted(rate, dtype):
+        """The 16 kHz fixture at the rate and format a stream asked for
+
+        Converted once per (rate, dtype) and kept on source, so recordings
+        don't pay for resampling 30 s of audio.
+        """
+        import numpy as np
+
+        from whisper_daemon import resample
+
+        key = (int(rate), str(dtype))
+        with source.lock:
+            if key not in source.converted:
+                if source.audio is None:
+                    source.audio = source.load()
+                audio = source.audio.astype(np.float32) / 32768
+                if key[0] != 16000:
+                    audio = resample(audio, 16000, key[0])
+                if key[1] == "int16":
+                    audio = np.clip(audio * 32768, -32768, 32767)
+                source.converted[key] = audio.astype(key[1])
+            return source.converted[key]
+
+    class Stream:
+        def __init__(self, samplerate, channels, dtype, callback, blocksize=None, **kwargs):
+            self.samplerate = samplerate
+            self.channels = channels
+            self.dtype = dtype
+            self.callback = callback
+            self.blocksize = blocksize or int(samplerate * 0.02)
+            self.running = False
+            self.started = time.monotonic()
+
+        @property
+        def time(self):
+            return time.monotonic() - self.started
+
+        def start(self):
+            self.running = True
+            threading.Thread(target=self._run, daemon=True).start()
+
+        def _run(self):
+            # Deliver blocks on the audio clock, not sleep-accumulated time
+            period = self.blocksize / self.samplerate
+            deadline = time.monotonic()
+            while self.running:
+                self._block()
+                deadline += period
+                time.sleep(max(0, deadline - time.monotonic()))
+
+        def close(self):
+            self.running = False
+
+        def __enter__(self):
+            self.start()
+            return self
+
+        def __exit__(self, *exc):
+            self.close()
+
+    class InputStream(Stream):
+        position = 0
+
+        def __init__(self, samplerate, channels, dtype, callback, **kwargs):
+            super().__init__(samplerate, channels, dtype, callback, **kwargs)
+            # Here rather than in the callback, which stands in for real time
+            self.audio = converted(samplerate, dtype)
+
+        def _block(self):
+            import numpy as np
+
+            end = self.position + self.blocksize
+            block = np.take(self.audio, np.arange(self.position, end), mode="wrap")
+            self.position = end % len(self.audio)
+            self.callback(block.reshape(-1, 1), self.blocksize, None, None)
+
+    class OutputStream(Stream):
+        def _block(self):
+            import numpy as np
+
+            outdata = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+            time_info = types.SimpleNamespace(outputBufferDacTime=self.time + 0.01)
+            self.callback(outdata, self.blocksize, time_info, None)
+
+    module.converted = converted
+    module.InputStream = InputStream
+    module.OutputStream = OutputStream
+    module.query_devices = lambda kind=None: {
+        "default_samplerate": 48000.0,
+        "max_input_channels": 1,
+        "max_output_channels": 2,
+    }
+    module.sleep = lambda msec: time.sleep(msec / 1000)
+    return module
+
+
+def run_daemon(workdir, daemon_args):
+    """Child process: run whisper_daemon.main() against the fakes in workdir"""
+    workdir = Path(workdir)
+    source = types.SimpleNamespace(audio=None, converted={}, lock=threading.Lock())
+    sys.modules["sounddevice"] = sd = fake_sounddevice(source)
+
+    sys.path.insert(0, str(REPO_DIR))
+    import whisper_daemon
+
+    fixture = os.environ.get("BENCH_FIXTURE")
+    if fixture:
+        source.load = lambda: whisper_daemon.load_audio(fixture)
+    else:
+        source.load = synthetic_speech
+
+    # Keep clear of a real daemon's socket and flag files
+    whisper_daemon.SOCKET_PATH = str(workdir / "daemon.sock")
+    whisper_daemon.RECORDING_FLAG = str(workdir / "recording")
+    whisper_daemon.STREAMING_FLAG = str(workdir / "streaming")
+    whisper_daemon.STREAM_LOG = str(workdir / "stream.log")
+
+    def prepare_fixture():
+        # Once the daemon is answering, like its own audio setup, so neither
+        # the first reply nor the first recording pays for the conversion
+        while not os.path.exists(whisper_daemon.SOCKET_PATH):
+            time.sleep(0.01)
+        rate = sd.query_devices(kind="input")["default_samplerate"]
+        for dtype in ("float32", "int16"):
+            sd.converted(rate, dtype)
+        (workdir / "fixture-ready").touch()
+
+    threading.Thread(target=prepare_fixture, daemon=True).start()
+
+    sys.argv = ["whisper_daemon.py", *daemon_args]
+    whisper_daemon.main()
+
+
+# --- Client side ---
+
+
+class Subscriber:
+    """A JSON connection that collects the daemon's events as they arrive"""
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.sock.sendall(b'{"cmd": "SUBSCRIBE"}\n')
+        self.events = []  # (monotonic time, event, message)
+        self.cond = threading.Condition()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.sock.makefile("r"):
+            message = json.loads(line)
+            if "event" in message:
+                with self.cond:
+                    self.events.append((time.monotonic(), message["event"], message))
+                    self.cond.notify_all()
+
+    def wait_terminal(self, count, since=0, timeout=EVENT_TIMEOUT):
+        """Wait for count finished dictations after index since
+
+        Returns their (time, event, message) entries.
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                done = [e for e in self.events[since:] if e[1] in TERMINAL_EVENTS]
+                if len(done) >= count:
+                    return done[:count]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"only {len(done)}/{count} dictations finished")
+                self.cond.wait(remaining)
+
+    def wait_ready(self, since=0, timeout=EVENT_TIMEOUT):
+        """Wait for a "ready" event after index since: all jobs are done"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while not any(e[1] == "ready" for e in self.events[since:]):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("daemon did not become ready")
+                self.cond.wait(remaining)
+
+    def close(self):
+        self.sock.close()
+
+
+def check_dictations(finished, record_seconds):
+    """Raise unless each dictation was typed once, from its own audio only
+
+    A recording that kept capturing into the next one shows up as a job
+    that sent the stubs far more audio than was spoken.
+    """
+    for _, event, message in finished:
+        if event != "typed":
+            raise RuntimeError(f"dictation ended with {event}: {message}")
+        heard = sum(float(s) for s in HEARD.findall(message["text"]))
+        if not 0 < heard <= record_seconds * 1.5:
+            raise RuntimeError(
+                f"a {record_seconds}s dictation was transcribed from {heard:.2f}s of audio"
+            )
+
+
+def request(socket_path, command):
+    """One plain-text request; returns the reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(command.encode())
+        reply = b""
+        while chunk := sock.recv(65536):
+            reply += chunk
+        return reply.decode()
+
+
+def summarize(values):
+    """p50/p90/max of seconds, in milliseconds"""
+    values = sorted(values)
+
+    def at(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+
+    return {"p50": at(0.5), "p90": at(0.9), "max": round(values[-1] * 1000, 3)}
+
+
+def peak_rss_mb(pid):
+    """The process's memory high-water mark, from /proc"""
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmHWM:"):
+            return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_stubs(workdir):
+    """Create stub whisper binaries, wtype and a dummy model; returns the bin dir"""
+    bin_dir = workdir / "bin"
+    bin_dir.mkdir()
+    stubs = {
+        "whisper-cli": STUB_CLI.format(python=sys.executable),
+        "whisper-server": STUB_SERVER.format(python=sys.executable),
+        "wtype": STUB_WTYPE,
+    }
+    for name, script in stubs.items():
+        path = bin_dir / name
+        path.write_text(script)
+        path.chmod(0o755)
+    # Big enough that prefetching the model is real work
+    with open(workdir / "ggml-base.en.bin", "wb") as model:
+        model.truncate(64 << 20)
+    return bin_dir
+
+
+def measure_ipc(socket_path, rounds):
+    """Round-trip of one-shot plain-text requests and of pipelined JSON ones"""
+    plain = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        request(socket_path, "STATUS")
+        plain.append(time.perf_counter() - start)
+
+    batch = 50
+    payload = "".join(
+        json.dumps({"cmd": "STATUS", "id": i}) + "\n" for i in range(batch)
+    ).encode()
+    pipelined = []
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        replies = sock.makefile("r")
+        for _ in range(max(1, rounds // 10)):
+            start = time.perf_counter()
+            sock.sendall(payload)
+            for _ in range(batch):
+                replies.readline()
+            pipelined.append((time.perf_counter() - start) / batch)
+    return summarize(plain), summarize(pipelined)
+
+
+def run_mode(mode, args, workdir):
+    """Start a daemon in the given mode, benchmark it and shut it down"""
+    bin_dir = workdir / "bin"
+    socket_path = str(workdir / "daemon.sock")
+    env = dict(
+        os.environ,
+        PATH=f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        BENCH_RTF=str(args.rtf),
+        BENCH_LOAD_DELAY=str(args.load_delay),
+        BENCH_TEXT="the quick brown fox jumps over the lazy dog",
+    )
+    if args.fixture:
+        env["BENCH_FIXTURE"] = str(Path(args.fixture).resolve())
+
+    daemon_args = [
+        "--model",
+        str(workdir / "ggml-base.en.bin"),
+        "--whisper-cli",
+        str(bin_dir / "whisper-cli"),
+        "--no-notifications",
+        # Every recording replays the same fixture: without this, all but the
+        # first dictation would be transcript cache hits
+        "--cache-size",
+        "0",
+    ]
+    if mode == "server":
+        daemon_args += ["--server-mode", "--server-port", str(free_port())]
+    daemon_args += args.daemon_args
+
+    log_path = workdir / f"daemon-{mode}.log"
+    with open(log_path, "wb") as log:
+        launched = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, __file__, "_daemon", str(workdir), *daemon_args],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+    subscriber = None
+    try:
+        # Up when it answers, ready when the model is loaded (server mode)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        first_reply = None
+        while True:
+            try:
+                status = json.loads(request(socket_path, "INFO"))
+                if first_reply is None:
+                    first_reply = time.monotonic() - launched
+                if status["model_loaded"] is not False:
+                    break
+            except (OSError, ValueError):
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"daemon did not start, see {log_path}")
+            time.sleep(0.005 if first_reply is None else 0.05)
+
+        # Don't time recordings against the fixture still being converted
+        while not (workdir / "fixture-ready").exists():
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"daemon did not start, see {log_path}")
+            time.sleep(0.05)
+
+        ipc_plain, ipc_pipelined = measure_ipc(socket_path, args.ipc_rounds)
+        subscriber = Subscriber(socket_path)
+
+        # Latency: one dictation at a time
+        latencies = []
+        for _ in range(args.dictations):
+            since = len(subscriber.events)
+            request(socket_path, "START")
+            time.sleep(args.record_seconds)
+            stopped = time.monotonic()
+            request(socket_path, "STOP")
+            finished = subscriber.wait_terminal(1, since)
+            check_dictations(finished, args.record_seconds)
+            latencies.append(finished[0][0] - stopped)
+            time.sleep(0.2)
+
+        # Throughput: back to back, without waiting for the text
+        since = len(subscriber.events)
+        started = time.monotonic()
+        for _ in range(args.dictations):
+            request(socket_path, "START")
+            time.sleep(args.record_seconds)
+            request(socket_path, "STOP")
+        finished = subscriber.wait_terminal(args.dictations, since)
+        elapsed = finished[-1][0] - started
+        check_dictations(finished, args.record_seconds)
+        # Only then is every job's metrics recorded, and nothing more typed
+        subscriber.wait_ready(subscriber.events.index(finished[-1]))
+        extra = subscriber.events.index(finished[-1]) + 1
+        if any(e[1] in TERMINAL_EVENTS for e in subscriber.events[extra:]):
+            raise RuntimeError("more dictations finished than were recorded")
+
+        outcomes = {}
+        for _, event, _ in subscriber.events:
+            if event in TERMINAL_EVENTS:
+                outcomes[event] = outcomes.get(event, 0) + 1
+
+        return {
+            "first_reply_ms": round(first_reply * 1000, 1),
+            "ipc_plain_ms": ipc_plain,
+            "ipc_pipelined_ms": ipc_pipelined,
+            "stop_to_typed_ms": summarize(latencies),
+            "throughput_per_min": round(args.dictations / elapsed * 60, 2),
+            "peak_rss_mb": peak_rss_mb(process.pid),
+            "outcomes": outcomes,
+            "stages": json.loads(request(socket_path, "METRICS")),
+        }
+    finally:
+        if subscriber:
+            subscriber.close()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def lookup(results, path):
+    for key in path:
+        results = results.get(key) if isinstance(results, dict) else None
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline, as printable lines"""
+    regressions = []
+    for mode, current in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if not previous:
+            continue
+        for path, higher_is_better, slack in CHECKS:
+            new, old = lookup(current, path), lookup(previous, path)
+            if new is None or old is None:
+                continue
+            change = old - new if higher_is_better else new - old
+            if change > slack and change > abs(old) * tolerance:
+                regressions.append(f"{mode} {'.'.join(path)}: {old} -> {new}")
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "_daemon":
+        run_daemon(sys.argv[2], sys.argv[3:])
+        return
+
+    parser = argparse.ArgumentParser(description="End-to-end Whisper daemon benchmark")
+    parser.add_argument(
+        "--modes", default="cli,server", help="Comma-separated modes (default: cli,server)"
+    )
+    parser.add_argument(
+        "--fixture", help="WAV (or ffmpeg-readable) file to use as microphone input "
+        "(default: synthetic speech)"
+    )
+    parser.add_argument(
+        "--dictations", type=int, default=5, help="Dictations per measurement (default: 5)"
+    )
+    parser.add_argument(
+        "--record-seconds", type=float, default=2.0, help="Length of each dictation (default: 2)"
+    )
+    parser.add_argument(
+        "--ipc-rounds", type=int, default=200, help="IPC round-trips to time (default: 200)"
+    )
+    parser.add_argument(
+        "--rtf", type=float, default=0.1,
+        help="Stub whisper's seconds of work per second of audio (default: 0.1)"
+    )
+    parser.add_argument(
+        "--load-delay", type=float, default=0.05,
+        help="Stub whisper's model load time in seconds (default: 0.05)"
+    )
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to check the results against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="Relative slowdown that counts as a regression (default: 0.25)"
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the work directory (daemon logs)"
+    )
+    parser.add_argument(
+        "daemon_args", nargs=argparse.REMAINDER,
+        help="Extra daemon flags after --, e.g. -- --incremental --no-vad"
+    )
+    args = parser.parse_args()
+    if args.daemon_args[:1] == ["--"]:
+        args.daemon_args = args.daemon_args[1:]
+
+    workdir = Path(tempfile.mkdtemp(prefix="whisper-bench-"))
+    write_stubs(workdir)
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            key: getattr(args, key)
+            for key in ("fixture", "dictations", "record_seconds", "rtf", "load_delay", "daemon_args")
+        },
+        "modes": {},
+    }
+    try:
+        for mode in args.modes.split(","):
+            print(f"Benchmarking {mode} mode...", file=sys.stderr)
+            results["modes"][mode] = run_mode(mode, args, workdir)
+    finally:
+        if args.keep:
+            print(f"Work directory: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -199,6 +199,8 @@ setup_python_env() {
     
     log_info "Installing Python dependencies..."
     run_cmd uv pip install -r "$DAEMON_DIR/requirements.txt"
+    # The service runs the daemon with -m, which starts from this bytecode
+    run_cmd "$DAEMON_DIR/.venv/bin/python" -m compileall -q "$DAEMON_DIR/whisper_daemon.py"
     
     log_success "Python environment ready"
 }
@@ -217,14 +219,15 @@ install_systemd_service() {
         cat > "$service_file" <<EOF
 [Unit]
 Description=Whisper Dictation Daemon
-After=graphical-session.target
+Wants=whisper.socket
+After=graphical-session.target whisper.socket
 
 [Service]
 Type=simple
 WorkingDirectory=$DAEMON_DIR
 Environment="WAYLAND_DISPLAY=wayland-1"
 Environment="XDG_RUNTIME_DIR=/run/user/1000"
-ExecStart=$DAEMON_DIR/.venv/bin/python $DAEMON_DIR/whisper_daemon.py --model $WHISPER_CPP_DIR/models/ggml-$MODEL_NAME.bin --whisper-cli $WHISPER_CPP_DIR/build/bin/whisper-cli --no-notifications
+ExecStart=$DAEMON_DIR/.venv/bin/python -m whisper_daemon --model $WHISPER_CPP_DIR/models/ggml-$MODEL_NAME.bin --whisper-cli $WHISPER_CPP_DIR/build/bin/whisper-cli --no-notifications
 Restart=on-failure
 RestartSec=5
 
@@ -232,15 +235,31 @@ RestartSec=5
 WantedBy=default.target
 EOF
         log_success "Service file created: $service_file"
+
+        # Socket activation: systemd holds the socket and starts the daemon
+        # on the first connection
+        cat > "$service_dir/whisper.socket" <<EOF
+[Unit]
+Description=Whisper Dictation Daemon socket
+
+[Socket]
+ListenStream=/tmp/whisper_daemon.sock
+SocketMode=0600
+
+[Install]
+WantedBy=sockets.target
+EOF
+        log_success "Socket file created: $service_dir/whisper.socket"
     else
         echo -e "${YELLOW}[DRY-RUN]${NC} Would create service file: $service_file"
+        echo -e "${YELLOW}[DRY-RUN]${NC} Would create socket file: $service_dir/whisper.socket"
     fi
     
     # Reload systemd
     run_cmd systemctl --user daemon-reload
     
-    # Enable and start service
-    run_cmd systemctl --user enable whisper.service
+    # Listen on the socket from login; the daemon starts on first use
+    run_cmd systemctl --user enable --now whisper.socket
     run_cmd systemctl --user start whisper.service
     
     log_success "Systemd service installed and started"
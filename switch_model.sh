@@ -5,6 +5,7 @@ set -e
 
 WHISPER_MODELS_DIR="$HOME/projects/whisper.cpp/models"
 SERVICE_FILE="$HOME/.config/systemd/user/whisper.service"
+SOCKET_PATH="/tmp/whisper_daemon.sock"
 
 # Get current model from systemd service
 get_current_model() {
@@ -129,8 +130,30 @@ cp "$SERVICE_FILE" "$SERVICE_FILE.backup.$(date +%Y%m%d_%H%M%S)"
 # Update the model path in ExecStart
 sed -i "s|--model [^ ]*|--model $model_path|" "$SERVICE_FILE"
 
-# Reload and restart service
 systemctl --user daemon-reload
+
+# Hot-swap the model in the running daemon (no restart, no downtime)
+response=""
+if [ -S "$SOCKET_PATH" ]; then
+    response=$(echo "MODEL $selected_model" | ncat -U "$SOCKET_PATH" 2>/dev/null) || true
+fi
+case "$response" in
+    SWITCHING|UNCHANGED)
+        notify-send "Whisper Model" "Switching to $selected_model..." -t 2000
+        exit 0
+        ;;
+    "")
+        ;;
+    *)
+        # The daemon is up but can't switch now (SWITCH_IN_PROGRESS while a
+        # model loads, MODEL_NOT_FOUND, ERROR); restarting would cut off a
+        # recording or the load in progress
+        notify-send "Whisper Model" "Could not switch to $selected_model: $response" -u critical -t 3000
+        exit 1
+        ;;
+esac
+
+# Daemon not reachable - restart it with the new model
 systemctl --user restart whisper.service
 
 # Check if service started successfully
@@ -0,0 +1,64 @@
+"""Silence trimming and resampling on synthetic recordings
+
+Run with: python -m pytest test_audio.py
+"""
+import numpy as np
+
+from whisper_daemon import (
+    RESAMPLE_HALF_TAPS,
+    SAMPLE_RATE,
+    StreamResampler,
+    resample,
+    trim_silence,
+)
+
+RNG = np.random.default_rng(0)
+
+
+def tone(seconds, amplitude, hz=220):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * hz * t)
+
+
+def noise(seconds, level=30):
+    return RNG.normal(0, level, int(seconds * SAMPLE_RATE))
+
+
+def pcm(audio):
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+
+def test_silence_is_dropped():
+    assert trim_silence(pcm(noise(2))) is None
+
+
+def test_leading_and_trailing_silence_trimmed():
+    audio = pcm(np.concatenate((noise(1), tone(1, 8000), noise(1))))
+    trimmed = trim_silence(audio)
+    assert 1.0 <= len(trimmed) / SAMPLE_RATE < 1.6
+
+
+def test_steady_speech_kept_whole():
+    audio = pcm(tone(2, 8000) + noise(2))
+    assert len(trim_silence(audio)) == len(audio)
+
+
+def test_continuous_speech_without_pauses_kept_whole():
+    # Loudness swings between 0.3 and 1.0 but never drops to a pause
+    t = np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE
+    envelope = 0.65 + 0.35 * np.sin(2 * np.pi * 3 * t)
+    audio = pcm(tone(2, 16000) * envelope + noise(2))
+    assert len(trim_silence(audio)) == len(audio)
+
+
+def test_stream_resampler_is_resample_delayed():
+    audio = RNG.normal(size=3 * 48000).astype(np.float32)
+    resampler = StreamResampler(48000, SAMPLE_RATE)
+    streamed = np.concatenate(
+        [resampler.process(audio[i : i + 480]) for i in range(0, len(audio), 480)]
+    )
+    batch = resample(audio, 48000, SAMPLE_RATE)
+    assert len(streamed) == len(batch)
+    np.testing.assert_allclose(
+        streamed[RESAMPLE_HALF_TAPS:], batch[:-RESAMPLE_HALF_TAPS], atol=1e-4
+    )
@@ -0,0 +1,127 @@
+"""Recording lifecycle against a fake microphone
+
+Run with: python -m pytest test_recording.py
+"""
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+import whisper_daemon
+from whisper_daemon import SAMPLE_RATE, WhisperDaemon
+
+BLOCK = 160  # 10 ms at 16 kHz
+
+
+class FakeInputStream:
+    """Calls back with consecutive sample numbers, so overlaps are visible"""
+
+    counter = 0
+    lock = threading.Lock()
+
+    def __init__(self, samplerate, channels, callback, dtype):
+        self.callback = callback
+        self.running = False
+
+    def __enter__(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+
+    def _run(self):
+        while self.running:
+            with FakeInputStream.lock:
+                start = FakeInputStream.counter
+                FakeInputStream.counter += BLOCK
+            block = (np.arange(start, start + BLOCK) % 32768).astype(np.int16)
+            self.callback(block.reshape(-1, 1), BLOCK, None, None)
+            time.sleep(BLOCK / SAMPLE_RATE)
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        whisper_daemon, "sd", types.SimpleNamespace(InputStream=FakeInputStream)
+    )
+    monkeypatch.setattr(whisper_daemon, "RECORDING_FLAG", str(tmp_path / "recording"))
+    daemon = WhisperDaemon(
+        tmp_path / "model.bin",
+        tmp_path / "whisper-cli",
+        notifications=False,
+        model_cache="off",
+        capture_rate=SAMPLE_RATE,
+    )
+    daemon.jobs_submitted = []
+    monkeypatch.setattr(daemon, "_submit_job", daemon.jobs_submitted.append)
+    monkeypatch.setattr(daemon, "play_sound", lambda name: None)
+    return daemon
+
+
+def wait_for_jobs(daemon, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(daemon.jobs_submitted) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return daemon.jobs_submitted
+
+
+def test_start_right_after_stop_starts_a_separate_recording(daemon):
+    assert daemon.start_recording() == "RECORDING"
+    time.sleep(0.3)
+    assert daemon.stop_recording() == "STOPPED"
+    assert daemon.start_recording() == "RECORDING"
+    time.sleep(0.3)
+    assert daemon.stop_recording() == "STOPPED"
+
+    first, second = wait_for_jobs(daemon, 2)
+    for job in (first, second):
+        assert 0.2 < len(job.audio_data) / SAMPLE_RATE < 0.5
+    # The first recording ended before the second began
+    assert int(first.audio_data[-1]) < int(second.audio_data[0])
+
+
+def test_dictation_can_be_replayed_once_typed(daemon, monkeypatch):
+    monkeypatch.setattr(daemon, "_transcribe", lambda audio, *args: "hello there")
+    monkeypatch.setattr(daemon, "_type_text", lambda text: None)
+    replies = {}
+
+    def emit(event, **fields):
+        if event == "typed" and not fields.get("replay"):
+            replies["replay"] = daemon.replay()
+            replies["metrics"] = daemon.metrics.snapshot()
+
+    monkeypatch.setattr(daemon, "emit", emit)
+    threading.Thread(target=daemon._transcription_worker, daemon=True).start()
+    job = whisper_daemon.TranscriptionJob(np.ones(SAMPLE_RATE, dtype=np.int16))
+    job.timeline.mark("stop")
+    daemon.jobs.put(job)
+    daemon.jobs.join()
+
+    assert replies["replay"] == "REPLAYED"
+    assert replies["metrics"]
+
+
+def test_replay_waits_for_the_dictation_being_typed(daemon, monkeypatch):
+    typed = []
+
+    def transcribe(audio, *args):
+        time.sleep(0.2)
+        return "second"
+
+    monkeypatch.delattr(daemon, "_submit_job")  # The real queue
+    monkeypatch.setattr(daemon, "_transcribe", transcribe)
+    monkeypatch.setattr(daemon, "_type_text", typed.append)
+    daemon.history.append({"segments": [], "prompt": None, "text": "first"})
+    threading.Thread(target=daemon._transcription_worker, daemon=True).start()
+    daemon.jobs.put(whisper_daemon.TranscriptionJob(np.ones(SAMPLE_RATE, dtype=np.int16)))
+    time.sleep(0.05)
+
+    assert daemon.replay() == "REPLAYED"
+    daemon.jobs.join()
+    assert typed == ["second", "first"]
@@ -0,0 +1,32 @@
+"""Finding the new text in stream mode's re-transcribed blocks
+
+Run with: python -m pytest test_stream.py
+"""
+import pytest
+
+from whisper_daemon import CommittedText
+
+
+@pytest.mark.parametrize(
+    "typed, block, new",
+    [
+        ("Hello there.", "Hello there. How are you?", "How are you?"),
+        ("Okay.", "Okay. Let me check that. Okay.", "Let me check that. Okay."),
+        (
+            "I went to the store.",
+            "I went to the store. Then I went to the store again.",
+            "Then I went to the store again.",
+        ),
+        ("Hello there", "Hello, there's a cat sitting on the mat", "a cat sitting on the mat"),
+    ],
+)
+def test_only_new_text_is_typed(typed, block, new):
+    committed = CommittedText()
+    assert committed.commit(typed) == typed
+    assert committed.commit(block) == new
+
+
+def test_repeated_block_types_nothing():
+    committed = CommittedText()
+    committed.commit("Let me check that.")
+    assert committed.commit("Let me check that.") == ""
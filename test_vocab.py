@@ -0,0 +1,61 @@
+"""Vocab correction against the shipped vocab.txt
+
+Run with: python -m pytest test_vocab.py
+"""
+from pathlib import Path
+
+import pytest
+
+from whisper_daemon import Vocab
+
+VOCAB = Vocab(Path(__file__).with_name("vocab.txt"))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "I need some rest",
+        "The rest of the team",
+        "Could you read me the menu?",
+        "Mr. Smith is here",
+        "Please get commit access",
+        "A B C D",
+        "I see you",
+        "Why don't you go home",
+        "A rust belt town",
+        "a pull request",
+        "a swift reply",
+        "I like the black pen",
+        "Express yourself",
+        "the fish swam away",
+        "the arch of the bridge",
+        "run the unit test",
+        "unit tests pass",
+    ],
+)
+def test_ordinary_sentences_unchanged(text):
+    assert VOCAB.correct(text) == (text, [])
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Use next JS with post gress", "Use Next.js with Postgres"),
+        ("install pee en pee em", "install pnpm"),
+        ("run N P M install", "run npm install"),
+        ("push to git hub", "push to GitHub"),
+        ("use NPM", "use npm"),
+        ("open V S code", "open VS Code"),
+        ("the C D command", "the cd command"),
+    ],
+)
+def test_misheard_terms_corrected(text, expected):
+    assert VOCAB.correct(text)[0] == expected
+
+
+def test_marked_terms_not_corrected(tmp_path):
+    path = tmp_path / "vocab.txt"
+    path.write_text("GitHub, !GitLab\n")
+    vocab = Vocab(path)
+    assert vocab.correct("push to git hub")[0] == "push to GitHub"
+    assert vocab.correct("push to git lab") == ("push to git lab", [])
@@ -3,6 +3,7 @@
 
 SERVICE_FILE="$HOME/.config/systemd/user/whisper.service"
 WHISPER_MODELS_DIR="$HOME/projects/whisper.cpp/models"
+SOCKET_PATH="/tmp/whisper_daemon.sock"
 
 # Default models for each mode
 CLI_MODEL="base.en"
@@ -40,8 +41,30 @@ else
     ICON="◆"
 fi
 
-# Restart daemon
 systemctl --user daemon-reload
+
+# Switch the running daemon over without a restart
+response=""
+if [ -S "$SOCKET_PATH" ]; then
+    response=$(echo "MODE ${MODE,,} $MODEL" | ncat -U "$SOCKET_PATH" 2>/dev/null)
+fi
+case "$response" in
+    SWITCHING|UNCHANGED)
+        notify-send "Whisper Mode" "$ICON Switching to $MODE mode with $MODEL..." -t 2000
+        exit 0
+        ;;
+    "")
+        ;;
+    *)
+        # The daemon is up but can't switch now (SWITCH_IN_PROGRESS while a
+        # model loads, MODEL_NOT_FOUND, ERROR); restarting would cut off a
+        # recording or the load in progress
+        notify-send "Whisper Mode" "Could not switch to $MODE mode: $response" -u critical -t 3000
+        exit 1
+        ;;
+esac
+
+# Daemon not reachable - restart it in the new mode
 systemctl --user restart whisper.service
 
 # Wait a moment for restart
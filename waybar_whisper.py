@@ -2,175 +2,176 @@
 """
 Waybar module for Whisper dictation status
 Shows animated recording indicator in waybar
+
+Keeps one connection to the daemon and subscribes to its state-change
+events, so it only wakes up (and prints) when something changes.
 """
 import json
 import socket
-import sys
 import time
 from pathlib import Path
 
 SOCKET_PATH = "/tmp/whisper_daemon.sock"
-RECORDING_FLAG = "/tmp/whisper_recording"
-STREAMING_FLAG = "/tmp/whisper_streaming"
 SERVICE_FILE = Path.home() / ".config/systemd/user/whisper.service"
+RECONNECT_DELAY = 2  # Seconds between connection attempts while the daemon is down
+
+# Mode and model parsed from the service file, refreshed only when its
+# mtime changes (used while the daemon isn't running)
+_service_cache = {"mtime": None, "mode": "cli", "model": "unknown"}
 
-# Icons with different states (text-based, no emojis)
-# Will be set based on server mode
-ICONS = {}
-RECORDING_FRAMES = []
-frame_index = 0
 
-def get_server_mode():
-    """Check if daemon is running in server mode"""
+def get_service_config():
+    """Get mode and model from the systemd service file (cached by mtime)"""
     try:
-        if not SERVICE_FILE.exists():
-            return False
-        
-        content = SERVICE_FILE.read_text()
-        return '--server-mode' in content
-    except:
-        return False
-
-def is_streaming():
-    """Check if streaming mode is active"""
-    return Path(STREAMING_FLAG).exists()
-
-def update_icons():
-    """Update icons based on server mode and streaming"""
-    global ICONS, RECORDING_FRAMES
-    
+        mtime = SERVICE_FILE.stat().st_mtime
+    except OSError:
+        mtime = None
+
+    if mtime != _service_cache["mtime"]:
+        _service_cache.update(mtime=mtime, mode="cli", model="unknown")
+        try:
+            content = SERVICE_FILE.read_text() if mtime is not None else ""
+        except OSError:
+            content = ""
+        if '--server-mode' in content:
+            _service_cache["mode"] = "server"
+        # Extract model path from ExecStart line
+        for line in content.split('\n'):
+            if 'ExecStart=' in line and '--model' in line:
+                model_path = line.split('--model')[1].strip().split()[0]
+                # Extract model name from path (e.g., ggml-base.en.bin -> base.en)
+                model_file = Path(model_path).name
+                if model_file.startswith('ggml-') and model_file.endswith('.bin'):
+                    _service_cache["model"] = model_file[5:-4]
+
+    return _service_cache
+
+
+def get_icons(is_server, streaming):
+    """Icons based on server mode and streaming"""
     # Streaming mode overrides server/CLI mode
-    if is_streaming():
+    if streaming:
         icon = "〰 streaming"
-        ICONS = {
+        return {
             "ready": icon,
             "recording": icon,
             "processing": icon,
             "error": "〰"
         }
-        RECORDING_FRAMES = [icon] * 4
-    else:
-        is_server = get_server_mode()
-        ready_icon = "◆" if is_server else "〰"
-        recording_icon = "◆" if is_server else "●"
-        
-        ICONS = {
-            "ready": ready_icon,
-            "recording": f"{recording_icon} dictation",
-            "processing": "dictation",
-            "error": ready_icon
-        }
-        
-        RECORDING_FRAMES = [f"{recording_icon} dictation"] * 4
 
+    ready_icon = "◆" if is_server else "〰"
+    recording_icon = "◆" if is_server else "●"
+    return {
+        "ready": ready_icon,
+        "recording": f"{recording_icon} dictation",
+        "processing": "dictation",
+        "error": ready_icon
+    }
 
-def get_current_model():
-    """Get current model name from systemd service file"""
-    try:
-        if not SERVICE_FILE.exists():
-            return "unknown"
-        
-        content = SERVICE_FILE.read_text()
-        # Extract model path from ExecStart line
-        for line in content.split('\n'):
-            if 'ExecStart=' in line and '--model' in line:
-                # Find --model argument
-                parts = line.split('--model')
-                if len(parts) > 1:
-                    model_path = parts[1].strip().split()[0]
-                    # Extract model name from path (e.g., ggml-base.en.bin -> base.en)
-                    model_file = Path(model_path).name
-                    if model_file.startswith('ggml-') and model_file.endswith('.bin'):
-                        return model_file[5:-4]  # Remove 'ggml-' prefix and '.bin' suffix
-        return "unknown"
-    except:
-        return "unknown"
-
-
-def get_daemon_status():
-    """Check daemon status via socket"""
-    if not Path(SOCKET_PATH).exists():
-        return "error"
-    
-    try:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.settimeout(0.5)
-        sock.connect(SOCKET_PATH)
-        sock.send(b"STATUS")
-        response = sock.recv(1024).decode().strip()
-        sock.close()
-        
-        if response == "RECORDING":
-            return "recording"
-        elif response == "READY":
-            return "ready"
+
+def get_waybar_output(status):
+    """Generate waybar JSON output from a daemon status snapshot (None: not running)"""
+    if status is None:
+        config = get_service_config()
+        is_server = config["mode"] == "server"
+        mode_text = "Server (model in memory)" if is_server else "CLI (loads each time)"
+        output = {
+            "text": get_icons(is_server, False)["error"],
+            "tooltip": f"Daemon not running\nModel: {config['model']}\nMode: {mode_text}",
+            "class": "error"
+        }
+        return json.dumps(output)
+
+    phase = status["phase"]
+    is_server = status["mode"] == "server"
+    icons = get_icons(is_server, phase == "streaming")
+    model = status["model"]
+    if is_server and not status.get("model_loaded"):
+        backend = status.get("backend")
+        if backend == "loading":
+            ready_in = status.get("ready_in")
+            model += f" (loading, ~{ready_in:.0f}s)" if ready_in else " (loading...)"
+        elif backend == "failed":
+            model += " (failed to load, using CLI)"
         else:
-            return "error"
-    except:
-        return "error"
-
-
-def get_waybar_output():
-    """Generate waybar JSON output"""
-    global frame_index
-    
-    # Update icons based on current mode
-    update_icons()
-    
-    # Check if streaming
-    streaming = is_streaming()
-    
-    if streaming:
-        # Streaming mode - show stream icon always
-        icon = ICONS["ready"]
-        tooltip = f"▶ Streaming (VAD mode)\nModel: base.en (streaming)\nSUPER+Shift+D: stop stream"
+            model += " (unloaded)"
+    if status.get("backend") == "recovering":
+        model += " (server recovering, using CLI)"
+    if status.get("switching"):
+        model += " (switching...)"
+    mode_text = "Server (model in memory)" if is_server else "CLI (loads each time)"
+
+    details = f"Model: {model}\nMode: {mode_text}"
+    if status.get("last_latency") is not None:
+        details += f"\nLast dictation: {status['last_latency']:.1f}s after stop"
+    if status.get("queue_depth", 0) > 1:
+        details += f"\nQueued: {status['queue_depth']}"
+    hints = "Right-click: switch model | SUPER+Shift+D: start stream"
+
+    if phase == "streaming":
+        icon = icons["ready"]
+        tooltip = f"▶ Streaming (VAD mode)\nModel: {status['stream_model']} (streaming)\nSUPER+Shift+D: stop stream"
         css_class = "streaming"
+    elif phase == "recording":
+        icon = icons["recording"]
+        tooltip = f"Recording... (SUPER+D to stop)\n{details}\n{hints}"
+        css_class = "recording"
+    elif phase == "processing":
+        icon = icons["processing"]
+        tooltip = f"Processing transcription...\n{details}\n{hints}"
+        css_class = "processing"
     else:
-        # Normal daemon mode
-        status = get_daemon_status()
-        model = get_current_model()
-        is_server = get_server_mode()
-        mode_text = "Server (model in memory)" if is_server else "CLI (loads each time)"
-        
-        # Check recording flag file for processing state
-        if Path(RECORDING_FLAG).exists() and status == "READY":
-            status = "processing"
-        
-        # Determine icon and tooltip
-        if status == "recording":
-            # Animate while recording
-            icon = RECORDING_FRAMES[frame_index % len(RECORDING_FRAMES)]
-            frame_index += 1
-            tooltip = f"Recording... (SUPER+D to stop)\nModel: {model}\nMode: {mode_text}\nRight-click: switch model | SUPER+Shift+D: start stream"
-            css_class = "recording"
-        elif status == "processing":
-            icon = ICONS["processing"]
-            tooltip = f"Processing transcription...\nModel: {model}\nMode: {mode_text}\nRight-click: switch model | SUPER+Shift+D: start stream"
-            css_class = "processing"
-        elif status == "ready":
-            icon = ICONS["ready"]
-            tooltip = f"Ready (SUPER+D to start)\nModel: {model}\nMode: {mode_text}\nRight-click: switch model | SUPER+Shift+D: start stream"
-            css_class = "ready"
-        else:
-            icon = ICONS["error"]
-            tooltip = f"Daemon not running\nModel: {model}\nMode: {mode_text}"
-            css_class = "error"
-    
+        icon = icons["ready"]
+        tooltip = f"Ready (SUPER+D to start)\n{details}\n{hints}"
+        css_class = "ready"
+
     output = {
         "text": icon,
         "tooltip": tooltip,
         "class": css_class
     }
-    
+
     return json.dumps(output)
 
 
+def watch_daemon(show):
+    """Subscribe to daemon events and show each new status until disconnected"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(0.5)
+        sock.connect(SOCKET_PATH)
+        sock.sendall(b'{"cmd": "SUBSCRIBE"}\n{"cmd": "INFO", "id": "info"}\n')
+        # Block until the daemon has something to say
+        sock.settimeout(None)
+        for line in sock.makefile("r"):
+            message = json.loads(line)
+            if message.get("id") == "info":
+                show(message.get("result"))
+            elif "status" in message:
+                show(message["status"])
+    finally:
+        sock.close()
+
+
 def main():
     """Main loop for waybar module"""
+    last_output = None
+
+    def show(status):
+        nonlocal last_output
+        output = get_waybar_output(status)
+        if output != last_output:
+            print(output, flush=True)
+            last_output = output
+
     try:
         while True:
-            print(get_waybar_output(), flush=True)
-            time.sleep(0.5)  # Update every 500ms for animation
+            try:
+                watch_daemon(show)
+            except (OSError, ValueError):
+                pass
+            show(None)
+            time.sleep(RECONNECT_DELAY)
     except KeyboardInterrupt:
         pass
     except BrokenPipeError:
@@ -5,11 +5,26 @@ Simpler version inspired by margo's whisper-dictation-daemon
 """
 
 import argparse
+import collections
+import concurrent.futures
+import contextlib
+import glob
+import hashlib
+import importlib
+import importlib.util
+import json
 import logging
+import math
+import mmap
 import os
 import queue
+import re
+import select
+import shlex
+import shutil
 import signal
 import socket
+import struct
 import subprocess
 import sys
 import tempfile
@@ -17,22 +32,222 @@ import threading
 import time
 from pathlib import Path
 
-import numpy as np
-import scipy.io.wavfile as wavfile
-import sounddevice as sd
 
-try:
-    import requests
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute access
 
-    HAS_REQUESTS = True
-except ImportError:
-    HAS_REQUESTS = False
+    numpy, sounddevice (and PortAudio behind it), requests and asyncio
+    together take far longer to import than the rest of the daemon;
+    deferring them lets the IPC socket answer before any of them are loaded.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+np = LazyModule("numpy")
+sd = LazyModule("sounddevice")
+requests = LazyModule("requests")
+asyncio = LazyModule("asyncio")  # Imported once EarlyResponder is answering
+HAS_REQUESTS = importlib.util.find_spec("requests") is not None
 
 # Configuration
 SOCKET_PATH = "/tmp/whisper_daemon.sock"
+SD_LISTEN_FDS_START = 3  # First file descriptor systemd passes on activation
 RECORDING_FLAG = "/tmp/whisper_recording"
+MAX_REQUEST_BYTES = 65536  # Longest JSON request line accepted
+SUBSCRIBER_BUFFER_LIMIT = 1 << 20  # Drop subscribers that stop reading
+EARLY_COMMANDS = ("STATUS", "INFO")  # Answered while the event loop starts
+EARLY_READ_TIMEOUT = 0.1  # Seconds to wait for an early client's command
+STREAMING_FLAG = "/tmp/whisper_streaming"
 SAMPLE_RATE = 16000
 CHANNELS = 1
+MAX_RECORD_SECONDS = 600  # Hard cap on a single recording's buffer
+
+# WAV format tags read_wav understands
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Polyphase resampling (the filter scipy's resample_poly uses by default)
+RESAMPLE_HALF_TAPS = 10  # Filter half-length, in input/output periods
+RESAMPLE_KAISER_BETA = 5.0
+RESAMPLE_CHUNK = 16384  # Output samples computed per step, bounding memory
+
+# Input conditioning, applied per block as audio arrives
+DC_BLOCK_POLE = 0.995  # One-pole DC blocker, ~13 Hz corner at 16 kHz
+DC_BLOCK_CHUNK = 256  # Samples the DC blocker unrolls at once
+HIGHPASS_ORDER = 2
+AGC_MAX_GAIN_DB = 20  # Most the gain normalizer will boost quiet input
+AGC_GATE_DBFS = -50  # Blocks quieter than this don't move the gain
+AGC_SMOOTHING = 0.1  # Fraction of the way to the new gain moved per block
+
+# Always-on input: audio from just before START is kept and prepended
+PREROLL_BLOCK_SECONDS = 0.05  # Input callback period while idle
+
+# Incremental mode: cut the live recording at pauses and transcribe early
+SEGMENT_PAUSE_SECONDS = 0.6  # Silence needed before a cut
+SEGMENT_MIN_SECONDS = 4.0  # Don't send segments shorter than this
+SEGMENT_SILENCE_RMS = 300  # int16 RMS below which a window counts as silence
+
+# Text output: short transcripts are typed, long ones pasted
+OUTPUT_METHODS = ("auto", "type", "paste")
+PASTE_THRESHOLD = 200  # Characters from which "auto" pastes instead of typing
+PASTE_KEYS = "ctrl+v"
+CLIPBOARD_RESTORE_DELAY = 0.5  # Seconds before the user's clipboard is put back
+TYPER_DRAIN_TIMEOUT = 30  # Seconds to wait for wtype to finish typing on close
+
+# Vocab prompt: whisper keeps at most 224 prompt tokens, and every prompt
+# token is decoded before the audio, so stay well below that
+PROMPT_TOKEN_BUDGET = 128
+APP_HINT = re.compile(r"\[apps:\s*([^\]]*)\]", re.IGNORECASE)
+
+# Vocab post-correction of transcripts
+CORRECTION_MAX_WORDS = 3  # Longest run of transcript words matched to one term
+CORRECTION_MAX_LETTERS = 6  # Longest run of spelled-out letters ("jay es oh en")
+CORRECTION_MIN_KEY = 5  # Shorter merged runs ("in it" -> init) are too ambiguous
+SPOKEN_LETTERS = {
+    name: letter
+    for letter, names in {
+        "a": "ay", "b": "b bee be", "c": "c see sea cee", "d": "d dee",
+        "e": "e ee", "f": "f ef eff", "g": "g gee", "h": "h aitch", "i": "eye",
+        "j": "j jay", "k": "k kay", "l": "l el ell", "m": "m em", "n": "n en",
+        "o": "o oh", "p": "p pee pea", "q": "q cue queue", "r": "r ar",
+        "s": "s es ess", "t": "t tee tea", "u": "u you", "v": "v vee",
+        "w": "w double-u", "x": "x ex", "y": "y why", "z": "z zee zed",
+    }.items()
+    for name in names.split()
+}
+# Ordinary English words: a run made only of these is left alone unless it
+# is already the term ("pull request"), so "read me" never becomes README
+# and "get commit" never becomes git commit; an acronym that spells one of
+# them (REST, MR) is never the correction of a single word. Vocab terms
+# don't belong here: VocabCorrector._distinctive and "!" in the vocab file
+# keep those that double as ordinary words (Rust, Swift) from being forced
+COMMON_WORDS = frozenset("""
+a i me my we our you your he him his she her it its they them their this
+that these those who whom whose what which when where why how all any both
+each few more most other some such no nor not only own same so than too
+very just also then there here now out up down off over under again once
+about above after before below between into through during until against
+among with without within from to of in on at by for as and but or if
+because while though although since unless is am are was were be been
+being have has had having do does did doing done can could shall should
+will would may might must need ought dare let lets get gets got getting
+go goes went gone going come comes came make makes made take takes took
+see saw seen look looks give gives gave say says said tell told ask asked
+know knew known think thought want wanted like liked use used using find
+found keep kept put puts run runs ran set sets show shows showed try tried
+call called work works worked feel felt leave left bring brought begin
+began start started stop stopped turn turned move moved live lived play
+played read reads write writes wrote written speak spoke talk talked hear
+heard open opened close closed hold held stand stood sit sat lose lost pay
+paid meet met send sent build built fall fell cut cuts reach kill remain
+suggest raise pass sell sold require report decide pull pulls pushed push
+add added change changed follow followed create spend spent grow grew
+offer remember love consider appear buy bought wait waited serve die
+expect stay fix fixed check checked save saved type typed press pick
+merge merged commit commits request requests access test tests testing
+one two three four five six seven eight nine ten first second third last
+next new old good bad great big small little long short high low large
+right wrong early late young important public private different
+real sure able free full whole clear easy hard simple strong special best
+better worse less least much many enough every another certain
+rest team menu home house room door window table chair bed car road
+street city town country world life day days week month year time times
+today tomorrow yesterday morning night evening hour minute moment way
+thing things part place case point group problem fact hand eye eyes head
+face word words name number people person man men woman women child
+children friend family mother father kid kids boy girl water food money
+book paper page line story job business system program question issue
+side kind end area idea body service state power school class order unit
+form level office note notes file files list key keys message email phone
+mr mrs ms dr st sir madam yes yeah okay ok please thanks thank hello hi
+hey sorry well oh um uh ah
+black white red green blue yellow brown grey gray dark light
+""".split())
+
+# Transcript cache and dictation history (REPLAY)
+CACHE_SIZE = 64  # Transcripts kept in memory
+CACHE_DISK_SIZE = 1000  # Transcripts kept in the optional disk tier
+HISTORY_SIZE = 8  # Recent dictations (audio and text) REPLAY can reach
+
+# Server mode
+SERVER_PORT = 8080  # First backend's port; the pool uses consecutive ports
+SERVER_READY_TIMEOUT = 30  # seconds
+SERVER_REQUEST_TIMEOUT = 30  # Seconds, or SERVER_SLOW_RTF x the audio if longer
+SERVER_SLOW_RTF = 3.0  # Responses slower than this x real time count as failures
+SERVER_SLOW_SECONDS = 10  # ...but only once they take at least this long
+SERVER_SUPERVISE_INTERVAL = 1  # Seconds between supervisor passes
+SERVER_HEALTH_INTERVAL = 10  # Seconds between health checks of an idle backend
+SERVER_HEALTH_TIMEOUT = 2
+SERVER_HEALTH_FAILURES = 3  # Failed checks in a row before a backend is restarted
+SERVER_RESTART_BACKOFF = 1  # Seconds before the first restart, doubling after
+SERVER_RESTART_MAX_BACKOFF = 60
+SERVER_STABLE_SECONDS = 120  # Uptime after which the backoff starts over
+SERVER_LOG_LINES = 20  # Backend output lines logged per window, the rest counted
+SERVER_LOG_WINDOW = 60  # seconds
+SERVER_LOG_TAIL = 20  # Last output lines kept, shown when a backend dies
+BREAKER_FAILURES = 3  # Failed server requests in a row before falling back to CLI
+BREAKER_COOLDOWN = 30  # Seconds on CLI before the server gets a trial request
+MODEL_LOAD_RATE = 200 << 20  # Bytes/s assumed for a model whose load was never timed
+
+# Latency metrics
+METRICS_WINDOW = 200  # Recent observations kept per series for percentiles
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+RTF_BUCKETS = (0.02, 0.05, 0.1, 0.2, 0.5, 1, 2)
+
+# Dictation stages, as (name, from mark, to mark) on a Timeline. "typed"
+# is when the text was handed to wtype (or pasted): wtype types it after
+# that at its own pace, which isn't included
+STAGES = (
+    ("capture_start", "keypress", "capture_start"),
+    ("queue_wait", "queued", "dequeued"),
+    ("vad", "transcribing", "speech_gated"),
+    ("model_wait", "speech_gated", "backend_ready"),
+    ("encode", "backend_ready", "encoded"),
+    ("inference", "encoded", "inferred"),
+    ("typing", "inferred", "typed"),
+    ("stop_to_typed", "stop", "typed"),
+)
+
+# CLI mode: keep the model file in the page cache
+MODEL_CACHE_POLICIES = ("off", "prefetch", "resident")
+
+# Transcription job queue
+JOB_QUEUE_SIZE = 4
+QUEUE_POLICIES = ("block", "drop-oldest", "reject")
+
+# Batch transcription
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".ogg", ".opus", ".flac", ".webm"}
+BATCH_OUTPUT = "transcripts.jsonl"
+
+# Speech gating before inference
+VAD_FRAME_SECONDS = 0.03
+VAD_MIN_RMS = 200  # Floor for the adaptive energy threshold (int16 RMS)
+VAD_NOISE_FACTOR = 3.0  # Energy threshold = noise floor * factor
+VAD_NOISE_CEILING = 0.25  # ...but at most this fraction of the loud frames' RMS
+VAD_ZCR_MIN = 0.1  # Zero-crossing rate that marks quiet unvoiced speech
+VAD_PAD_SECONDS = 0.2  # Audio kept around each speech region
+VAD_MAX_PAUSE_SECONDS = 0.8  # Longer internal pauses are shortened to this
+VAD_MIN_SPEECH_SECONDS = 0.25  # Less speech than this skips the model
+
+# Stream mode (whisper-stream in VAD mode)
+STREAM_LOG = "/tmp/whisper_stream.log"
+STREAM_WINDOW_MS = 30000  # Audio window whisper-stream re-transcribes
+STREAM_HISTORY_WORDS = 64  # Typed words kept for overlap matching
+STREAM_MIN_OVERLAP_WORDS = 2
+STREAM_REVISED_WORDS = 8  # Typed words compared when whisper revised some of them
+STREAM_TIMESTAMP = re.compile(r"^\[[^\]]*-->[^\]]*\]\s*")
+
+# Whisper's transcriptions of non-speech, e.g. "[BLANK_AUDIO]" or "(silence)"
+NOISE_PATTERN = re.compile(r"^\s*(\(.*\)|\[.*\]|\*.*\*)\s*$")
 
 # Set up logging
 logging.basicConfig(
@@ -46,6 +261,1758 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def model_name(model_path):
+    """Short model name, e.g. ggml-base.en.bin -> base.en"""
+    name = Path(model_path).name
+    if name.startswith("ggml-") and name.endswith(".bin"):
+        return name[5:-4]
+    return name
+
+
+def encode_wav(audio_data, sample_rate=SAMPLE_RATE):
+    """Encode int16 mono samples as an in-memory WAV file"""
+    pcm = memoryview(np.ascontiguousarray(audio_data, dtype="<i2")).cast("B")
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + pcm.nbytes,
+        b"WAVE",
+        b"fmt ",
+        16,  # PCM fmt chunk size
+        1,  # PCM format
+        CHANNELS,
+        sample_rate,
+        sample_rate * CHANNELS * 2,  # Byte rate
+        CHANNELS * 2,  # Block align
+        16,  # Bits per sample
+        b"data",
+        pcm.nbytes,
+    )
+    return header + pcm
+
+
+def read_wav(path):
+    """Read a PCM or float WAV file as (sample_rate, samples)
+
+    Samples come back as scipy.io.wavfile would return them: one column per
+    channel when there are several, and 24-bit audio in the top bytes of
+    int32.
+    """
+    data = Path(path).read_bytes()
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError(f"{path} is not a WAV file")
+
+    fmt = None
+    position = 12
+    while position + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, position)
+        body = position + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", data, body)
+            if fmt[0] == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                # The real format tag leads the subformat GUID
+                fmt = struct.unpack_from("<H", data, body + 24) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError(f"{path} has no fmt chunk before its data")
+            break
+        position = body + size + (size & 1)  # Chunks are word-aligned
+    else:
+        raise ValueError(f"{path} has no data chunk")
+
+    format_tag, channels, rate, _, block_align, bits = fmt
+    payload = data[body : body + size]
+    payload = payload[: len(payload) // block_align * block_align]
+    if format_tag == WAVE_FORMAT_FLOAT and bits in (32, 64):
+        samples = np.frombuffer(payload, dtype=f"<f{bits // 8}")
+    elif format_tag == WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        samples = padded.view("<i4").reshape(-1)
+    elif format_tag == WAVE_FORMAT_PCM and bits in (8, 16, 32):
+        samples = np.frombuffer(payload, dtype=np.uint8 if bits == 8 else f"<i{bits // 8}")
+    else:
+        raise ValueError(f"Unsupported WAV format {format_tag} ({bits}-bit) in {path}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return rate, samples
+
+
+def trim_silence(audio_data, sample_rate=SAMPLE_RATE):
+    """Trim silence from a recording using frame energy and zero-crossing rate
+
+    Leading and trailing silence is removed and internal pauses longer than
+    VAD_MAX_PAUSE_SECONDS are shortened. Returns None when the recording holds
+    less than VAD_MIN_SPEECH_SECONDS of speech.
+    """
+    frame = int(VAD_FRAME_SECONDS * sample_rate)
+    n_frames = len(audio_data) // frame
+    if n_frames == 0:
+        return None
+
+    frames = audio_data[: n_frames * frame].reshape(n_frames, frame)
+    samples = frames.astype(np.float32)
+    rms = np.sqrt(np.mean(samples * samples, axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+
+    # Adaptive threshold from the quietest frames, capped below the loudest
+    # ones in case the recording has no pauses to measure the noise in;
+    # quieter frames with a high zero-crossing rate are kept too so
+    # fricatives ("s", "f") survive
+    floor, loud = np.percentile(rms, (10, 90))
+    threshold = max(
+        VAD_MIN_RMS, min(floor * VAD_NOISE_FACTOR, loud * VAD_NOISE_CEILING)
+    )
+    speech = (rms > threshold) | ((rms > threshold / 2) & (zcr > VAD_ZCR_MIN))
+    if speech.all():
+        return audio_data  # Speech throughout, nothing to trim
+    if np.count_nonzero(speech) * VAD_FRAME_SECONDS < VAD_MIN_SPEECH_SECONDS:
+        return None
+
+    # Pad speech regions so word onsets and tails aren't clipped
+    pad = int(VAD_PAD_SECONDS / VAD_FRAME_SECONDS)
+    keep = np.convolve(speech, np.ones(2 * pad + 1), mode="same") > 0
+
+    # Position of every silent frame within its run of silence
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], keep, [1])).astype(np.int8)))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    run_lengths = run_ends - run_starts
+    silent = np.flatnonzero(~keep)
+    offset = silent - np.repeat(run_starts, run_lengths)
+    length = np.repeat(run_lengths, run_lengths)
+
+    # Leading/trailing runs go entirely; internal runs keep half of the
+    # allowed pause at each end
+    half = int(VAD_MAX_PAUSE_SECONDS / VAD_FRAME_SECONDS) // 2
+    internal = (np.repeat(run_starts, run_lengths) > 0) & (
+        np.repeat(run_ends, run_lengths) < n_frames
+    )
+    keep[silent] = internal & ((offset < half) | (offset >= length - half))
+
+    return frames[keep].reshape(-1)
+
+
+def load_audio(path):
+    """Load an audio file as 16 kHz mono int16 samples
+
+    WAV files are read directly; other formats are decoded with ffmpeg.
+    """
+    path = Path(path)
+    if path.suffix.lower() != ".wav":
+        if not shutil.which("ffmpeg"):
+            raise RuntimeError(f"ffmpeg is needed to decode {path.suffix} files")
+        result = subprocess.run(
+            ["ffmpeg", "-nostdin", "-v", "error", "-i", str(path)]
+            + ["-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+            capture_output=True,
+            check=True,
+        )
+        return np.frombuffer(result.stdout, dtype=np.int16)
+
+    rate, audio_data = read_wav(path)
+    if audio_data.ndim > 1:
+        audio_data = audio_data.mean(axis=1)
+    if audio_data.dtype.kind == "f":
+        audio_data = audio_data * 32767
+    elif audio_data.dtype == np.int32:
+        audio_data = audio_data / 65536
+    elif audio_data.dtype == np.uint8:
+        audio_data = (audio_data.astype(np.int16) - 128) * 256
+    if rate != SAMPLE_RATE:
+        audio_data = resample(audio_data, rate, SAMPLE_RATE)
+    return np.clip(audio_data, -32768, 32767).astype(np.int16)
+
+
+def polyphase_filter(up, down):
+    """Anti-aliasing filter for resampling by up/down, split into phases
+
+    The same Kaiser-windowed sinc scipy's resample_poly designs by default.
+    Row p holds taps p, p + up, p + 2*up, ... so each output sample is one
+    row dotted with the most recent input samples. Returns (bank, taps).
+    """
+    max_rate = max(up, down)
+    taps = 2 * RESAMPLE_HALF_TAPS * max_rate + 1
+    n = np.arange(taps) - (taps - 1) / 2
+    window = np.kaiser(taps, RESAMPLE_KAISER_BETA)
+    lowpass = np.sinc(n / max_rate) * window
+    lowpass *= up / lowpass.sum()  # Unity gain after zero-stuffing by up
+    phases = -(-taps // up)
+    bank = np.zeros(phases * up)
+    bank[:taps] = lowpass
+    return bank.reshape(phases, up).T.astype(np.float32), taps
+
+
+def polyphase(samples, bank, up, positions):
+    """Filter output at each upsampled index in positions
+
+    Output t is sum(h[t - n*up] * samples[n]); callers pad samples so every
+    index the filter spans is inside the array.
+    """
+    newest = positions // up
+    window = samples[newest[:, np.newaxis] - np.arange(bank.shape[1])]
+    return np.einsum("ij,ij->i", bank[positions % up], window)
+
+
+def resample(audio_data, from_rate, to_rate):
+    """Polyphase-resample audio (along the first axis) to another rate"""
+    divisor = math.gcd(from_rate, to_rate)
+    up, down = to_rate // divisor, from_rate // divisor
+    audio_data = np.asarray(audio_data, dtype=np.float32)
+    if audio_data.ndim > 1:
+        return np.stack(
+            [resample(column, from_rate, to_rate) for column in audio_data.T], axis=1
+        )
+
+    bank, taps = polyphase_filter(up, down)
+    pad = np.zeros(bank.shape[1], dtype=np.float32)
+    padded = np.concatenate((pad, audio_data, pad))
+    # Centered on the filter, so the output lines up with the input
+    offset = (taps - 1) // 2 + len(pad) * up
+    output = np.empty(-(-len(audio_data) * up // down), dtype=np.float32)
+    for start in range(0, len(output), RESAMPLE_CHUNK):
+        index = np.arange(start, min(start + RESAMPLE_CHUNK, len(output)))
+        output[index] = polyphase(padded, bank, up, index * down + offset)
+    return output
+
+
+def estimate_tokens(text):
+    """Rough whisper (GPT-2 BPE) token count: ~4 letters per token, 1 per symbol"""
+    return sum(
+        math.ceil(len(piece) / 4) if piece.isalpha() else 1
+        for piece in re.findall(r"[A-Za-z]+|\d+|\S", text)
+    )
+
+
+def collapse(text):
+    """Keep lowercase letters, digits, + and #: both "Next.js" and "next JS" -> nextjs"""
+    return re.sub(r"[^a-z0-9+#]", "", text.lower())
+
+
+SOUND_RULES = [
+    (re.compile(pattern), replacement)
+    for pattern, replacement in (
+        (r"ph", "f"), (r"ck", "k"), (r"dg", "j"), (r"q", "k"), (r"x", "ks"),
+        (r"z", "s"), (r"c(?=[eiy])", "s"), (r"c", "k"),
+        (r"(?<=.)[aeiouyhw]", ""), (r"(.)\1+", r"\1"),
+    )
+]
+
+
+def sound_key(text):
+    """Consonant skeleton of a collapsed string, so that postgress ~ postgres"""
+    for pattern, replacement in SOUND_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def deletions(key):
+    """key and every string one deletion away from it"""
+    return {key} | {key[:i] + key[i + 1 :] for i in range(len(key))}
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            )
+        previous = current
+    return previous[-1]
+
+
+def sway_focused_app():
+    """app_id (or X11 class) of the focused sway window, or None"""
+    try:
+        result = subprocess.run(
+            ["swaymsg", "-t", "get_tree"], capture_output=True, check=True, timeout=1
+        )
+        nodes = [json.loads(result.stdout)]
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+    while nodes:
+        node = nodes.pop()
+        if node.get("focused"):
+            return node.get("app_id") or node.get("window_properties", {}).get("class")
+        nodes.extend(node.get("nodes", []) + node.get("floating_nodes", []))
+    return None
+
+
+def command_focus_source(command):
+    """A focus source that runs command and reads the app name from its output"""
+    args = shlex.split(command)
+
+    def focused_app():
+        try:
+            result = subprocess.run(args, capture_output=True, text=True, timeout=1)
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return result.stdout.strip().splitlines()[0] if result.stdout.strip() else None
+
+    return focused_app
+
+
+def prefetch_file(path):
+    """Ask the kernel to start reading a file into the page cache"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning(f"Could not prefetch {path}: {e}")
+
+
+def map_resident(path):
+    """Map a file read-only and fault in every page; returns the mmap
+
+    Holding the mapping keeps the pages referenced so they are among the
+    last to be evicted from the page cache (it does not pin them).
+    """
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    mapping.madvise(mmap.MADV_WILLNEED)
+    # Read one byte per page so the whole file is faulted in now
+    np.frombuffer(mapping, dtype=np.uint8)[:: mmap.PAGESIZE].sum()
+    return mapping
+
+
+def find_audio_files(pattern):
+    """Audio files in a directory, or matching a glob pattern, sorted"""
+    path = Path(pattern).expanduser()
+    if path.is_dir():
+        files = [p for p in path.iterdir() if p.suffix.lower() in AUDIO_EXTENSIONS]
+    else:
+        files = [Path(p) for p in glob.glob(str(path), recursive=True)]
+    return sorted(p for p in files if p.is_file())
+
+
+class AudioBuffer:
+    """Growable, preallocated int16 sample buffer written from the audio callback
+
+    Capacity doubles as needed (so a long dictation costs a handful of
+    reallocations instead of one allocation per callback) and never grows
+    past max_samples; audio beyond the cap is dropped.
+    """
+
+    def __init__(self, max_samples, initial_samples=SAMPLE_RATE * 30):
+        self.max_samples = max_samples
+        self._data = np.empty(min(initial_samples, max_samples), dtype=np.int16)
+        self._length = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._length
+
+    def write(self, samples):
+        """Append samples (any shape, flattened) to the buffer"""
+        samples = samples.reshape(-1)
+        needed = self._length + len(samples)
+        if needed > len(self._data):
+            self._grow(needed)
+        count = min(len(samples), len(self._data) - self._length)
+        self._data[self._length : self._length + count] = samples[:count]
+        self._length += count
+        self.dropped += len(samples) - count
+
+    def _grow(self, needed):
+        capacity = len(self._data)
+        if capacity >= self.max_samples:
+            return
+        while capacity < needed and capacity < self.max_samples:
+            capacity *= 2
+        data = np.empty(min(capacity, self.max_samples), dtype=np.int16)
+        data[: self._length] = self._data[: self._length]
+        self._data = data
+
+    def view(self, start=0, end=None):
+        """Return a no-copy view of the recorded samples"""
+        end = self._length if end is None else min(end, self._length)
+        return self._data[start:end]
+
+
+def _normalize_word(word):
+    """Lowercase and strip punctuation so revisions like "Excellent." match"""
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+class StreamResampler:
+    """Polyphase resampler that carries its filter state from block to block
+
+    Uses the same anti-aliasing filter as resample(), keeping just enough
+    past input between blocks that the output is seamless. It is resample()
+    of the whole recording delayed by the filter's group delay (when
+    downsampling, RESAMPLE_HALF_TAPS output samples, under a millisecond at
+    16 kHz): output starts with the filter settling on the silence before
+    the first block, and the last input samples stay in the filter until
+    the next block arrives. Nothing flushes them; a recording loses that
+    fraction of a millisecond at its end.
+    """
+
+    def __init__(self, from_rate, to_rate):
+        divisor = math.gcd(from_rate, to_rate)
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        self.bank, _ = polyphase_filter(self.up, self.down)
+        # Silence before the first block, so the filter always has full input
+        self.history = np.zeros(self.bank.shape[1], dtype=np.float32)
+        self.start = -len(self.history)  # Input index of history[0]
+        self.consumed = 0  # Input samples seen
+        self.produced = 0  # Output samples returned
+
+    def process(self, block):
+        samples = np.concatenate((self.history, block))
+        self.consumed += len(block)
+        # Every output whose newest input sample has arrived
+        ready = (self.consumed * self.up - 1) // self.down + 1
+        if ready == self.produced:
+            self.history = samples
+            return np.zeros(0, dtype=np.float32)
+        positions = np.arange(self.produced, ready) * self.down - self.start * self.up
+        output = polyphase(samples, self.bank, self.up, positions)
+        self.produced = ready
+
+        self.history = samples[-self.bank.shape[1] :]
+        self.start = self.consumed - len(self.history)
+        return output
+
+
+class InputConditioner:
+    """Turns microphone blocks at the device's rate into 16 kHz int16
+
+    Each block is resampled as it arrives and, optionally, DC-blocked,
+    high-passed and gain-normalized, all with state carried between blocks,
+    so a recording is ready to transcribe the moment it stops.
+    """
+
+    def __init__(self, rate, dc_block=False, highpass_hz=0, gain_dbfs=None):
+        self.rate = rate
+        self.passthrough = rate == SAMPLE_RATE and not (
+            dc_block or highpass_hz or gain_dbfs is not None
+        )
+        # Float input avoids quantizing twice when we process it anyway
+        self.dtype = "int16" if self.passthrough else "float32"
+        self.resampler = StreamResampler(rate, SAMPLE_RATE) if rate != SAMPLE_RATE else None
+
+        self.dc_block = dc_block
+        self.dc_input = 0.0  # Last input and output sample of the DC blocker
+        self.dc_output = 0.0
+        self.highpass = None
+        if highpass_hz:
+            # The only use of scipy, so it's only needed with --highpass
+            from scipy.signal import butter, sosfilt
+
+            self.sosfilt = sosfilt
+            self.highpass = butter(
+                HIGHPASS_ORDER, highpass_hz, "highpass", fs=SAMPLE_RATE, output="sos"
+            )
+            self.highpass_state = np.zeros((self.highpass.shape[0], 2))
+        self.target = 10 ** (gain_dbfs / 20) if gain_dbfs is not None else None
+        self.gain = 1.0
+
+    def process(self, indata):
+        if self.passthrough:
+            return indata.reshape(-1)
+
+        block = indata[:, 0] if indata.ndim > 1 else indata
+        if self.resampler:
+            block = self.resampler.process(block)
+        if self.dc_block and len(block):
+            block = self._block_dc(block)
+        if self.highpass is not None:
+            block, self.highpass_state = self.sosfilt(
+                self.highpass, block, zi=self.highpass_state
+            )
+        if self.target is not None and len(block):
+            block = self._normalize(block)
+        return np.clip(block * 32768, -32768, 32767).astype(np.int16)
+
+    def _block_dc(self, block):
+        """y[n] = x[n] - x[n-1] + pole * y[n-1], evaluated in closed form
+
+        Unrolled over short chunks, y = pole^n * (pole * y[-1] + cumsum(d / pole^n))
+        with d the first difference, so the recursion needs no Python loop
+        per sample and pole^-n stays small enough to keep full precision.
+        """
+        diff = np.diff(block.astype(np.float64), prepend=self.dc_input)
+        self.dc_input = float(block[-1])
+        output = np.empty_like(diff)
+        for start in range(0, len(diff), DC_BLOCK_CHUNK):
+            chunk = diff[start : start + DC_BLOCK_CHUNK]
+            powers = DC_BLOCK_POLE ** np.arange(len(chunk))
+            output[start : start + len(chunk)] = powers * (
+                DC_BLOCK_POLE * self.dc_output + np.cumsum(chunk / powers)
+            )
+            self.dc_output = output[start + len(chunk) - 1]
+        return output
+
+    def _normalize(self, block):
+        level = math.sqrt(float(np.mean(np.square(block))))
+        gain = self.gain
+        if level > 10 ** (AGC_GATE_DBFS / 20):
+            wanted = min(self.target / level, 10 ** (AGC_MAX_GAIN_DB / 20))
+            gain += (wanted - gain) * AGC_SMOOTHING
+        # Ramp across the block so gain changes never click
+        ramp = np.linspace(self.gain, gain, len(block), dtype=np.float32)
+        self.gain = gain
+        return block * ramp
+
+
+class PrerollInput:
+    """Always-open input stream that keeps the last moments of audio
+
+    While idle the callback only overwrites a small ring buffer; during a
+    recording it writes into the recording's AudioBuffer, which starts with
+    the ring's contents so speech from just before START is kept.
+    """
+
+    def __init__(self, preroll_samples, conditioner):
+        self.conditioner = conditioner
+        self.ring = np.zeros(preroll_samples, dtype=np.int16)
+        self.position = 0  # Next write index in the ring
+        self.filled = 0
+        self.target = None  # AudioBuffer while recording
+        self.lock = threading.Lock()
+        self.stream = None
+
+    def open(self):
+        rate = self.conditioner.rate
+        self.stream = sd.InputStream(
+            samplerate=rate,
+            channels=CHANNELS,
+            callback=self._callback,
+            dtype=self.conditioner.dtype,
+            blocksize=int(PREROLL_BLOCK_SECONDS * rate),
+        )
+        self.stream.start()
+
+    def _callback(self, indata, frames, time, status):
+        if status:
+            logger.warning(f"Audio callback status: {status}")
+        samples = self.conditioner.process(indata)
+        with self.lock:
+            if self.target is not None:
+                self.target.write(samples)
+                return
+
+            size = len(self.ring)
+            samples = samples[-size:]
+            end = self.position + len(samples)
+            if end <= size:
+                self.ring[self.position : end] = samples
+            else:
+                split = size - self.position
+                self.ring[self.position :] = samples[:split]
+                self.ring[: end - size] = samples[split:]
+            self.position = end % size
+            self.filled = min(size, self.filled + len(samples))
+
+    def begin(self, buffer):
+        """Send audio to buffer, starting with the pre-roll"""
+        with self.lock:
+            start = (self.position - self.filled) % len(self.ring)
+            buffer.write(np.roll(self.ring, -start)[: self.filled])
+            self.filled = 0
+            self.target = buffer
+
+    def end(self, buffer):
+        """Stop sending audio to buffer, unless a newer recording took over"""
+        with self.lock:
+            if self.target is buffer:
+                self.target = None
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+
+class CuePlayer:
+    """Plays short audio cues on a persistent output stream without blocking
+
+    Cues are converted once, at load time, to the output device's native
+    rate and channel count, so playing one only hands a buffer to the
+    stream callback. The delay between each play() call and the cue
+    reaching the device is recorded for report().
+    """
+
+    def __init__(self):
+        self.cues = {}
+        self.stream = None
+        self.rate = None
+        self.channels = 1
+        self.playing = None  # [samples, position, requested_at, name]
+        self.delays = collections.deque(maxlen=32)
+
+    def open(self):
+        """Open the output stream at the default device's native rate"""
+        device = sd.query_devices(kind="output")
+        self.rate = int(device["default_samplerate"])
+        self.channels = max(1, min(2, device["max_output_channels"]))
+        self.stream = sd.OutputStream(
+            samplerate=self.rate,
+            channels=self.channels,
+            dtype="float32",
+            callback=self._callback,
+        )
+        self.stream.start()
+
+    def load(self, name, path):
+        rate, data = read_wav(path)
+        if data.dtype.kind == "f":
+            data = data.astype(np.float32)
+        elif data.dtype == np.uint8:
+            data = (data.astype(np.float32) - 128) / 128
+        else:
+            data = data.astype(np.float32) / np.iinfo(data.dtype).max
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+
+        # Match the device's channel count and rate once, up front
+        if data.shape[1] > self.channels:
+            data = data.mean(axis=1, keepdims=True)
+        if data.shape[1] < self.channels:
+            data = np.repeat(data[:, :1], self.channels, axis=1)
+        if rate != self.rate:
+            data = resample(data, rate, self.rate)
+        self.cues[name] = np.ascontiguousarray(data, dtype=np.float32)
+
+    def play(self, name):
+        """Start playing a cue and return immediately"""
+        cue = self.cues.get(name)
+        if cue is None or self.stream is None:
+            return
+        # Replaced in one assignment, so the callback never sees a half update
+        self.playing = [cue, 0, self.stream.time, name]
+
+    def _callback(self, outdata, frames, time_info, status):
+        playing = self.playing
+        if playing is None:
+            outdata.fill(0)
+            return
+
+        cue, position, requested_at, name = playing
+        if position == 0:
+            self.delays.append((name, time_info.outputBufferDacTime - requested_at))
+        chunk = cue[position : position + frames]
+        outdata[: len(chunk)] = chunk
+        outdata[len(chunk) :] = 0
+        playing[1] = position + frames
+        if playing[1] >= len(cue) and self.playing is playing:
+            self.playing = None
+
+    def report(self):
+        """Log how late each cue played since the last report"""
+        while self.delays:
+            name, delay = self.delays.popleft()
+            logger.info(f"Cue '{name}' reached the device {delay * 1000:.0f} ms after request")
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+
+class WtypeTyper:
+    """A long-lived `wtype -` process that types whatever is written to it
+
+    Writes return as soon as the text is in the pipe, so typing overlaps
+    with whatever the caller does next; wtype gives no sign of when it has
+    finished, so the "typed" mark is the hand-off. A dead process is
+    restarted on the next write.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.lock = threading.Lock()
+
+    def type(self, text):
+        with self.lock:
+            for attempt in range(2):
+                if not self.process or self.process.poll() is not None:
+                    self.process = subprocess.Popen(["wtype", "-"], stdin=subprocess.PIPE)
+                try:
+                    self.process.stdin.write(text.encode())
+                    self.process.stdin.flush()
+                    return
+                except BrokenPipeError:
+                    self.process = None
+                    if attempt:
+                        raise
+
+    def close(self, timeout=TYPER_DRAIN_TIMEOUT):
+        """Let wtype finish typing what it has been sent, then stop it"""
+        with self.lock:
+            if not self.process:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=timeout)
+            except (BrokenPipeError, subprocess.TimeoutExpired):
+                self.process.kill()
+            self.process = None
+
+
+class ClipboardPaster:
+    """Paste text through the Wayland clipboard, then put the old contents back
+
+    The old contents are saved as one MIME type, plain text if offered and
+    otherwise the first type (an image stays an image); apps offering
+    several types get back only that one.
+    """
+
+    def __init__(self, keys=PASTE_KEYS):
+        *modifiers, key = keys.lower().split("+")
+        self.paste_cmd = ["wtype"]
+        self.paste_cmd += [arg for mod in modifiers for arg in ("-M", mod)]
+        self.paste_cmd += ["-k", key]
+        self.paste_cmd += [arg for mod in reversed(modifiers) for arg in ("-m", mod)]
+        self.saved = None  # User's clipboard as (type, bytes), while a restore is pending
+        self.restore_timer = None
+
+    @staticmethod
+    def available():
+        return bool(shutil.which("wl-copy") and shutil.which("wl-paste"))
+
+    def paste(self, text):
+        if self.restore_timer and self.restore_timer.is_alive():
+            # The clipboard still holds our last paste: keep the saved contents
+            self.restore_timer.cancel()
+        else:
+            self.saved = self._save()
+
+        subprocess.run(["wl-copy"], input=text.encode(), check=True, timeout=2)
+        subprocess.run(self.paste_cmd, check=True, timeout=5)
+
+        if self.saved is not None:
+            # The target app reads the clipboard asynchronously after the keys
+            self.restore_timer = threading.Timer(CLIPBOARD_RESTORE_DELAY, self._restore)
+            self.restore_timer.daemon = True
+            self.restore_timer.start()
+
+    @staticmethod
+    def _save():
+        """The clipboard as (MIME type, contents), or None if it is empty"""
+        listed = subprocess.run(
+            ["wl-paste", "--list-types"], capture_output=True, text=True, timeout=2
+        )
+        types = listed.stdout.split() if listed.returncode == 0 else []
+        if not types:
+            return None
+        mime = next((t for t in types if t.startswith("text/plain")), types[0])
+        result = subprocess.run(
+            ["wl-paste", "--no-newline", "--type", mime], capture_output=True, timeout=2
+        )
+        return (mime, result.stdout) if result.returncode == 0 else None
+
+    def _restore(self):
+        (mime, contents), self.saved, self.restore_timer = self.saved, None, None
+        try:
+            subprocess.run(["wl-copy", "--type", mime], input=contents, timeout=2)
+        except Exception as e:
+            logger.warning(f"Could not restore clipboard: {e}")
+
+
+class TextOutput:
+    """Sends text to the focused window, typed or (when long) pasted"""
+
+    def __init__(self, method="auto", paste_threshold=PASTE_THRESHOLD, paste_keys=PASTE_KEYS):
+        self.method = method
+        self.paste_threshold = paste_threshold
+        self.typer = WtypeTyper()
+        self.paster = None
+        if method != "type":
+            if ClipboardPaster.available():
+                self.paster = ClipboardPaster(paste_keys)
+            else:
+                logger.warning("wl-clipboard not found, typing all text instead of pasting")
+
+    def send(self, text):
+        paste = self.method == "paste" or (
+            self.method == "auto" and len(text) >= self.paste_threshold
+        )
+        if paste and self.paster:
+            # Text still queued in wtype must land before the paste does
+            self.typer.close()
+            self.paster.paste(text)
+        else:
+            self.typer.type(text)
+
+    def close(self):
+        self.typer.close(timeout=2)
+
+
+class Timeline:
+    """Monotonic timestamps of the stages of one dictation"""
+
+    def __init__(self):
+        self.marks = {}
+        self.audio_seconds = None  # Length of the audio sent to the model
+        self.backend = None  # "server" or "cli", whichever transcribed it
+
+    def mark(self, stage):
+        # First mark wins, so per-callback marks like capture_start are cheap
+        self.marks.setdefault(stage, time.monotonic())
+
+    def between(self, start, end):
+        if start in self.marks and end in self.marks:
+            return self.marks[end] - self.marks[start]
+        return None
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram plus a window of recent values"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=METRICS_WINDOW)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(q):
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))], 4)
+
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 4),
+            "p50": percentile(0.5),
+            "p90": percentile(0.9),
+            "p99": percentile(0.99),
+        }
+
+
+class Metrics:
+    """Per-stage latency and real-time factor, labelled by model and mode"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.histograms = {}  # (metric, stage, model, mode) -> Histogram
+        self.lock = threading.Lock()
+
+    def _observe(self, metric, stage, model, mode, value):
+        key = (metric, stage, model, mode)
+        if key not in self.histograms:
+            buckets = RTF_BUCKETS if metric == "rtf" else STAGE_BUCKETS
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].observe(value)
+
+    def record(self, timeline, model, mode):
+        """Add a finished dictation's stage durations"""
+        with self.lock:
+            for stage, start, end in STAGES:
+                seconds = timeline.between(start, end)
+                if seconds is not None:
+                    self._observe("stage", stage, model, mode, seconds)
+            inference = timeline.between("encoded", "inferred")
+            if inference is not None and timeline.audio_seconds:
+                rtf = inference / timeline.audio_seconds
+                self._observe("rtf", "inference", model, mode, rtf)
+        self.write()
+
+    def observe(self, stage, model, mode, seconds):
+        """Add a duration measured outside a dictation, e.g. a model load"""
+        with self.lock:
+            self._observe("stage", stage, model, mode, seconds)
+        self.write()
+
+    def median(self, metric, stage, model, mode):
+        """Recent median of one series, or None if it has no values yet"""
+        with self.lock:
+            histogram = self.histograms.get((metric, stage, model, mode))
+            return histogram.summary()["p50"] if histogram else None
+
+    def snapshot(self):
+        """Rolling summaries, e.g. {"base.en/server": {"inference": {...}}}"""
+        result = {}
+        with self.lock:
+            for (metric, stage, model, mode), histogram in self.histograms.items():
+                name = "rtf" if metric == "rtf" else stage
+                series = result.setdefault(f"{model}/{mode}", {})
+                series[name] = histogram.summary()
+        return result
+
+    def prometheus(self):
+        """All histograms in the Prometheus text exposition format"""
+        lines = []
+        metrics = (
+            ("stage", "whisper_stage_seconds", "Dictation stage duration"),
+            ("rtf", "whisper_realtime_factor", "Inference time / audio time"),
+        )
+        with self.lock:
+            for metric, name, help_text in metrics:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(self.histograms.items()):
+                    if key[0] != metric:
+                        continue
+                    labels = f'stage="{key[1]}",model="{key[2]}",mode="{key[3]}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(
+                        f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}'
+                    )
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Atomically rewrite the Prometheus text file, if one is configured"""
+        if not self.path:
+            return
+        try:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(self.prometheus())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file: {e}")
+
+
+class ServerBackend:
+    """A single whisper-server process
+
+    Its output is read continuously, so the server can never block on a
+    full pipe, and logged at a limited rate; the last lines are kept to
+    explain a crash.
+    """
+
+    def __init__(self, cmd, port):
+        self.cmd = cmd
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = None
+        self.in_flight = 0
+        self.state = "down"  # starting, healthy, unhealthy or down
+        self.started_at = 0.0
+        self.last_check = 0.0
+        self.failed_checks = 0
+        self.restarts = 0  # Restarts since the backend last ran stably
+        self.next_restart = 0.0
+        self.log_tail = collections.deque(maxlen=SERVER_LOG_TAIL)
+        self.log_window = 0.0
+        self.logged = 0
+        self.suppressed = 0
+
+    def start(self):
+        logger.info(f"Starting whisper-server on port {self.port}...")
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        self.state = "starting"
+        self.started_at = time.monotonic()
+        self.failed_checks = 0
+        threading.Thread(
+            target=self._drain, args=(self.process,), name=f"server-log-{self.port}", daemon=True
+        ).start()
+
+    def stop(self, timeout=5):
+        process, self.process = self.process, None
+        self.state = "down"
+        if process is None:
+            return
+        if process.poll() is None:
+            process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def _drain(self, process):
+        for raw in process.stdout:
+            line = raw.decode(errors="replace").rstrip()
+            if line:
+                self._log(line)
+        process.stdout.close()
+
+    def _log(self, line):
+        self.log_tail.append(line)
+        now = time.monotonic()
+        if now - self.log_window >= SERVER_LOG_WINDOW:
+            if self.suppressed:
+                logger.info(f"whisper-server:{self.port}: {self.suppressed} more lines not logged")
+            self.log_window, self.logged, self.suppressed = now, 0, 0
+        if self.logged < SERVER_LOG_LINES:
+            self.logged += 1
+            logger.info(f"whisper-server:{self.port}: {line}")
+        else:
+            self.suppressed += 1
+
+
+class CircuitBreaker:
+    """Stops sending requests to a failing server for a while
+
+    After `failures` failed requests in a row it opens: allow() refuses
+    for `cooldown` seconds, then lets a single trial request through,
+    whose outcome closes the breaker or opens it again.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.failed = 0
+        self.opened_at = None
+        self.trial = False  # A trial request is in flight
+        self.lock = threading.Lock()
+
+    @property
+    def open(self):
+        with self.lock:
+            return self.opened_at is not None and (
+                self.trial or time.monotonic() - self.opened_at < self.cooldown
+            )
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.trial = True
+            return True
+
+    def record(self, success):
+        """Count a request's outcome; returns True if the breaker changed state"""
+        with self.lock:
+            was_open = self.opened_at is not None
+            if success:
+                self.failed = 0
+                self.opened_at = None
+            else:
+                self.failed += 1
+                if self.trial or self.failed >= self.failures:
+                    self.opened_at = time.monotonic()
+            self.trial = False
+            return was_open != (self.opened_at is not None)
+
+
+class BackendPool:
+    """whisper-server processes on consecutive ports, dispatched least-loaded
+
+    Once ready, a supervisor thread watches the backends until stop(): a
+    backend that exits, or fails its health checks, is restarted with
+    exponential backoff, and requests only go to healthy ones. Failed or
+    very slow requests feed a circuit breaker; while it is open the daemon
+    uses whisper-cli.
+    """
+
+    def __init__(self, server_bin, model_path, size, base_port, threads, on_change=None):
+        self.model_path = Path(model_path)
+        self.base_port = base_port
+        self.lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+        self.on_change = on_change  # Called when the pool's health changes
+        self.stopping = threading.Event()
+        self.backends = []
+        for port in range(base_port, base_port + size):
+            cmd = [
+                str(server_bin),
+                "--model",
+                str(model_path),
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(port),
+                "--threads",
+                str(threads),
+                "--processors",
+                "1",  # Keep at 1 - this is for parallel inference, not CPU cores
+                "--no-timestamps",
+            ]
+            self.backends.append(ServerBackend(cmd, port))
+
+    def __len__(self):
+        return len(self.backends)
+
+    def start(self):
+        for backend in self.backends:
+            backend.start()
+
+    def wait_ready(self, http, timeout=SERVER_READY_TIMEOUT):
+        """Wait until every backend answers HTTP; False on timeout or exit"""
+        deadline = time.time() + timeout
+        waiting = list(self.backends)
+        while waiting and time.time() < deadline:
+            backend = waiting[0]
+            if backend.process.poll() is not None:
+                logger.error(
+                    f"whisper-server on port {backend.port} exited with code "
+                    f"{backend.process.returncode}{self._last_words(backend)}"
+                )
+                return False
+            try:
+                response = http.get(f"{backend.url}/", timeout=1)
+                if response.status_code in [200, 404]:  # Server is responding
+                    backend.state = "healthy"
+                    waiting.pop(0)
+                    continue
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.5)
+        return not waiting
+
+    def supervise(self):
+        threading.Thread(target=self._supervise, name="server-supervisor", daemon=True).start()
+
+    def stop(self, timeout=5):
+        self.stopping.set()
+        for backend in self.backends:
+            if backend.process and backend.process.poll() is None:
+                backend.process.terminate()
+        for backend in self.backends:
+            backend.stop(timeout)
+
+    def drain(self, timeout=60):
+        """Wait for requests in flight to finish; returns False on timeout"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if not any(backend.in_flight for backend in self.backends):
+                    return True
+            time.sleep(0.1)
+        return False
+
+    @property
+    def healthy(self):
+        """Whether requests can go to the server right now"""
+        return not self.breaker.open and any(
+            backend.state == "healthy" for backend in self.backends
+        )
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """Reserve the healthy backend with the fewest requests in flight
+
+        Yields None if no backend is healthy.
+        """
+        with self.lock:
+            healthy = [b for b in self.backends if b.state == "healthy"]
+            backend = min(healthy, key=lambda b: b.in_flight) if healthy else None
+            if backend:
+                backend.in_flight += 1
+        try:
+            yield backend
+        finally:
+            if backend:
+                with self.lock:
+                    backend.in_flight -= 1
+
+    def report(self, backend, success, slow=False):
+        """Record a request's outcome; a backend that errored is rechecked at once"""
+        if not success and not slow and backend and backend.state == "healthy":
+            backend.state = "unhealthy"
+            backend.last_check = 0.0
+            self._changed()
+        if self.breaker.record(success):
+            if self.breaker.opened_at is None:
+                logger.info("whisper-server is answering again, leaving whisper-cli fallback")
+            else:
+                logger.warning(
+                    f"whisper-server keeps failing, using whisper-cli for "
+                    f"{self.breaker.cooldown}s"
+                )
+            self._changed()
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change()
+
+    @staticmethod
+    def _last_words(backend):
+        tail = [line for line in backend.log_tail if line.strip()][-3:]
+        return f": {' | '.join(tail)}" if tail else ""
+
+    def _supervise(self):
+        # Its own session: health checks run alongside dictation requests
+        http = requests.Session()
+        while not self.stopping.wait(SERVER_SUPERVISE_INTERVAL):
+            for backend in self.backends:
+                try:
+                    self._check(backend, http)
+                except Exception as e:
+                    logger.error(f"Supervising whisper-server on port {backend.port}: {e}")
+        http.close()
+
+    def _check(self, backend, http):
+        now = time.monotonic()
+        if backend.process is None:
+            if now >= backend.next_restart and not self.stopping.is_set():
+                backend.start()
+            return
+
+        code = backend.process.poll()
+        if code is not None:
+            logger.error(
+                f"whisper-server on port {backend.port} exited with code {code}"
+                f"{self._last_words(backend)}"
+            )
+            self._restart(backend)
+            return
+
+        if backend.state == "healthy" and (
+            backend.in_flight or now - backend.last_check < SERVER_HEALTH_INTERVAL
+        ):
+            return  # Busy backends report trouble through their requests
+        backend.last_check = now
+        try:
+            response = http.get(f"{backend.url}/", timeout=SERVER_HEALTH_TIMEOUT)
+            answered = response.status_code in (200, 404)
+        except requests.exceptions.RequestException:
+            answered = False
+
+        if answered:
+            if backend.state != "healthy":
+                logger.info(f"whisper-server on port {backend.port} is healthy")
+                backend.state = "healthy"
+                self._changed()
+            backend.failed_checks = 0
+            if now - backend.started_at > SERVER_STABLE_SECONDS:
+                backend.restarts = 0
+        elif backend.state == "starting":
+            if now - backend.started_at > SERVER_READY_TIMEOUT:
+                logger.error(f"whisper-server on port {backend.port} never became ready")
+                self._restart(backend)
+        else:
+            backend.failed_checks += 1
+            if backend.state == "healthy":
+                backend.state = "unhealthy"
+                self._changed()
+            logger.warning(
+                f"whisper-server on port {backend.port} failed a health check "
+                f"({backend.failed_checks}/{SERVER_HEALTH_FAILURES})"
+            )
+            if backend.failed_checks >= SERVER_HEALTH_FAILURES:
+                self._restart(backend)
+
+    def _restart(self, backend):
+        """Stop a dead or hung backend and schedule its restart, backing off"""
+        backend.stop(timeout=2)
+        delay = min(
+            SERVER_RESTART_MAX_BACKOFF, SERVER_RESTART_BACKOFF * 2**backend.restarts
+        )
+        backend.restarts += 1
+        backend.next_restart = time.monotonic() + delay
+        logger.warning(f"Restarting whisper-server on port {backend.port} in {delay:.0f}s")
+        self._changed()
+
+
+class VocabCorrector:
+    """Fixes misheard vocab terms in transcripts
+
+    Runs of up to CORRECTION_MAX_WORDS words are looked up, longest first:
+    by their collapsed letters (next JS -> Next.js), as spelled-out letters
+    (pee en pee em -> pnpm), and by sound key (post gress -> Postgres).
+    Sound keys are indexed by all their one-deletion variants, so keys one
+    edit apart share an entry and a lookup costs a handful of dict probes
+    however many terms there are. Fuzzy candidates must also be spelled
+    within one edit per 6 letters of what was heard, and never so far off
+    that a whole word at either end of the run could be dropped ("a swift"
+    is not Swift). A single word is only ever corrected to a distinctive
+    term (C++, GitHub, npm), never to one that doubles as an ordinary word
+    (Go, Rust, promise, REST), and an ordinary word is never corrected at
+    all. A run that already spells a multi-word term is kept as that term
+    ("unit test", not unittest); other runs of ordinary words
+    (COMMON_WORDS) are left alone.
+    """
+
+    def __init__(self, terms):
+        self.exact = {}  # Collapsed key -> term
+        self.phrases = {}  # Lowercased multi-word term -> term
+        self.near = collections.defaultdict(list)  # Sound key variant -> terms
+        self.lookups = {}  # Memo of run -> term or None
+        for term in terms:
+            if " " in term:
+                self.phrases.setdefault(term.lower(), term)
+            key = collapse(term)
+            if not key or key in self.exact:
+                continue
+            self.exact[key] = term
+            if len(key) >= CORRECTION_MIN_KEY:
+                for variant in deletions(sound_key(key)):
+                    self.near[variant].append(term)
+
+    @staticmethod
+    def _distinctive(term):
+        lower = term.lower()
+        if lower in COMMON_WORDS:
+            return False  # Go, REST, MR
+        if term.isalpha() and term[1:].islower():
+            return not re.search("[aeiouy]", lower)  # npm, but not Rust
+        return True
+
+    def _find(self, words):
+        if len(words) > 1 and all(word.lower() in SPOKEN_LETTERS for word in words):
+            term = self.exact.get("".join(SPOKEN_LETTERS[w.lower()] for w in words))
+            if term:
+                return term
+        if len(words) > CORRECTION_MAX_WORDS:
+            return None
+        if len(words) > 1:
+            # Already a term as heard: "unit test" stays, not unittest
+            term = self.phrases.get(" ".join(words).lower())
+            if term:
+                return term
+        if all(word.lower() in COMMON_WORDS for word in words):
+            return None
+
+        key = collapse("".join(words))
+        term = self.exact.get(key)
+        if len(words) == 1:
+            if term and self._distinctive(term):
+                return term
+        elif term and len(key) >= CORRECTION_MIN_KEY:
+            return term
+        if len(key) < CORRECTION_MIN_KEY:
+            return None
+
+        allowed = max(1, len(key) // 6)
+        if len(words) > 1:
+            # Fewer edits than the shortest end word has letters
+            ends = (collapse(words[0]), collapse(words[-1]))
+            allowed = min(allowed, min(len(end) for end in ends) - 1)
+        best = None
+        for variant in deletions(sound_key(key)):
+            for term in self.near.get(variant, ()):
+                if len(words) == 1 and not self._distinctive(term):
+                    continue
+                distance = levenshtein(key, collapse(term))
+                if distance <= allowed and (best is None or distance < best[0]):
+                    best = (distance, term)
+        return best[1] if best else None
+
+    def find(self, words):
+        """The term a run of words was meant to be, or None"""
+        run = tuple(words)
+        if run not in self.lookups:
+            if len(self.lookups) > 10000:
+                self.lookups.clear()
+            self.lookups[run] = self._find(words)
+        return self.lookups[run]
+
+    def correct(self, text):
+        """Returns (corrected text, [(heard, term), ...])"""
+        # Words with the punctuation around them split off
+        tokens = [
+            re.match(r"^(\W*)(.*?)([.,!?;:]*)$", token).groups() for token in text.split()
+        ]
+        letters = [word.lower() in SPOKEN_LETTERS for _, word, _ in tokens] + [False]
+        output = []
+        corrections = []
+        i = 0
+        while i < len(tokens):
+            for n in range(min(CORRECTION_MAX_LETTERS, len(tokens) - i), 0, -1):
+                run = tokens[i : i + n]
+                # Don't merge across punctuation inside the run
+                if any(lead for lead, _, _ in run[1:]) or any(t for _, _, t in run[:-1]):
+                    continue
+                # Only a whole spelling is a term: not the "C D" of "B C D"
+                if n > 1 and all(letters[i : i + n]) and (
+                    (i and letters[i - 1]) or letters[i + n]
+                ):
+                    continue
+                words = [word for _, word, _ in run]
+                if not all(words):
+                    continue
+                term = self.find(words)
+                heard = " ".join(words)
+                if term and term != heard:
+                    corrections.append((heard, term))
+                    output.append(run[0][0] + term + run[-1][2])
+                    i += n
+                    break
+                if term:  # Already right: leave these words alone
+                    output.append("".join(run[0]) + "".join(
+                        " " + "".join(token) for token in run[1:]
+                    ))
+                    i += n
+                    break
+            else:
+                output.append("".join(tokens[i]))
+                i += 1
+        if not corrections:
+            return text, corrections
+        return " ".join(output), corrections
+
+
+class Vocab:
+    """Vocabulary file, turned into whisper prompts that fit a token budget
+
+    Terms are grouped by the "# Category" comment above them. A category
+    header may end in "[apps: code, kitty]"; when the focused app's name
+    contains one of those, that category's terms are picked first. The file
+    is re-read whenever its mtime changes. Terms also drive correct(),
+    except those written with a leading "!".
+    """
+
+    def __init__(self, path, token_budget=PROMPT_TOKEN_BUDGET):
+        self.path = Path(path)
+        self.token_budget = token_budget
+        self.mtime = None
+        self.terms = []  # (term, apps of its category), in file order
+        self.prompts = {}  # Focused app -> prompt, cleared on reload
+        self.corrector = None
+        self.uncorrected = set()  # Terms marked "!": prompt only
+        self.lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return
+        self.mtime = mtime
+        self.terms = []
+        self.prompts = {}
+        self.uncorrected = set()
+        if mtime is None:
+            logger.warning(f"Vocab file not found: {self.path}")
+            return
+
+        try:
+            seen = set()
+            apps = ()
+            for line in self.path.read_text().splitlines():
+                line = line.strip()
+                if line.startswith("#"):
+                    hint = APP_HINT.search(line)
+                    apps = tuple(
+                        app.strip().lower() for app in hint.group(1).split(",") if app.strip()
+                    ) if hint else ()
+                    continue
+                line = re.sub(r"\s#.*", "", line)  # Inline comment (but keep "C#")
+                for term in (t.strip() for t in line.split(",")):
+                    if term.startswith("!"):
+                        term = term[1:].strip()
+                        self.uncorrected.add(term)
+                    if term and term.lower() not in seen:
+                        seen.add(term.lower())
+                        self.terms.append((term, apps))
+            logger.info(f"Loaded {len(self.terms)} vocab terms from {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to load vocab file: {e}")
+        self.corrector = VocabCorrector(
+            term for term, _ in self.terms if term not in self.uncorrected
+        )
+
+    def correct(self, text):
+        """Fix misheard vocab terms; returns (text, [(heard, term), ...])"""
+        with self.lock:
+            self._reload()
+            if not self.corrector:
+                return text, []
+            return self.corrector.correct(text)
+
+    def prompt(self, app=None):
+        """The prompt for dictating into app (None: no context)"""
+        with self.lock:
+            self._reload()
+            app = (app or "").lower()
+            if app not in self.prompts:
+                self.prompts[app] = self._build(app)
+            return self.prompts[app]
+
+    def _build(self, app):
+        def matches(apps):
+            return bool(app) and any(hint in app for hint in apps)
+
+        ordered = [term for term, apps in self.terms if matches(apps)]
+        ordered += [term for term, apps in self.terms if not matches(apps)]
+        chosen = []
+        tokens = 0
+        for term in ordered:
+            cost = estimate_tokens(term) + 1  # Plus the separating comma
+            if tokens + cost <= self.token_budget:
+                chosen.append(term)
+                tokens += cost
+
+        # Whisper attends most to the end of the prompt: most relevant last
+        prompt = ", ".join(reversed(chosen)) or None
+        if len(chosen) < len(self.terms):
+            logger.info(
+                f"Vocab prompt for {app or 'any app'}: {len(chosen)} of "
+                f"{len(self.terms)} terms fit {self.token_budget} tokens"
+            )
+        return prompt
+
+
+class TranscriptCache:
+    """LRU of transcripts keyed by a hash of the audio, model and prompt
+
+    The most recent entries live in memory. With a directory, every entry
+    is also written there as a small JSON file, so hits survive restarts;
+    the directory is pruned to the least recently used disk_size files.
+    """
+
+    def __init__(self, size=CACHE_SIZE, directory=None, disk_size=CACHE_DISK_SIZE):
+        self.size = size
+        self.directory = Path(directory).expanduser() if directory else None
+        self.disk_size = disk_size
+        self.entries = collections.OrderedDict()  # key -> text
+        self.lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(audio_data, *context):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(memoryview(np.ascontiguousarray(audio_data)).cast("B"))
+        for item in context:
+            digest.update(b"\0" + str(item).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """The cached text for key, or None"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        if not self.directory:
+            return None
+        path = self.directory / f"{key}.json"
+        try:
+            text = json.loads(path.read_text())["text"]
+            os.utime(path)  # Mark as recently used for pruning
+        except (OSError, ValueError, KeyError):
+            return None
+        self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        self._remember(key, text)
+        if not self.directory:
+            return
+        try:
+            tmp = self.directory / f"{key}.tmp"
+            tmp.write_text(json.dumps({"text": text, "time": time.time()}))
+            os.replace(tmp, self.directory / f"{key}.json")
+            files = list(self.directory.glob("*.json"))
+            if len(files) > self.disk_size:
+                files.sort(key=lambda path: path.stat().st_mtime)
+                for path in files[: len(files) - self.disk_size]:
+                    path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not write transcript cache: {e}")
+
+    def _remember(self, key, text):
+        with self.lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class TranscriptionJob:
+    """A finished recording waiting to be transcribed and typed"""
+
+    _ids = iter(range(1, sys.maxsize))
+
+    def __init__(self, audio_data, pending=(), model_state=None):
+        self.id = next(self._ids)
+        self.audio_data = audio_data
+        self.pending = list(pending)
+        self.model_state = model_state  # "warm"/"cold" at START (server mode)
+        self.prompt = None  # Vocab prompt chosen at START
+        self.segments = [audio_data]  # All of the recording's audio, for REPLAY
+        self.text = None  # A kept transcript REPLAY types as is, in turn
+        self.timeline = Timeline()
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.pending:
+            future.cancel()
+
+
+class CommittedText:
+    """Words already typed in stream mode, used to find what is new in a block
+
+    whisper-stream re-transcribes its whole audio window after every pause,
+    so each block repeats earlier speech. The new text is whatever follows
+    the longest run of recently typed words found in the block; the match is
+    a single KMP pass over the reversed word lists, so it is linear in the
+    block length. When whisper revised the last typed words ("there" ->
+    "there's") there is no exact run, and the end of the typed text is
+    found by comparing words loosely instead.
+    """
+
+    def __init__(self, max_words=STREAM_HISTORY_WORDS):
+        self.words = collections.deque(maxlen=max_words)
+        self.last_commit = 0.0
+
+    def _overlap_end(self, current):
+        """Index in current just past the longest suffix of typed words, or None"""
+        pattern = list(reversed(self.words))
+
+        # KMP failure function over the reversed history
+        fail = [0] * len(pattern)
+        k = 0
+        for i in range(1, len(pattern)):
+            while k and pattern[i] != pattern[k]:
+                k = fail[k - 1]
+            if pattern[i] == pattern[k]:
+                k += 1
+            fail[i] = k
+
+        best_len, best_end = 0, None
+        k = 0
+        for i, word in enumerate(reversed(current)):
+            while k and word != pattern[k]:
+                k = fail[k - 1]
+            if word == pattern[k]:
+                k += 1
+            if k >= best_len:
+                # Reversed position i ends the match, so it starts at
+                # len(current) - 1 - i going forwards. Of equally long
+                # matches the earliest wins: the typed text sits at the
+                # start of the window, and a repeat of it later is new speech
+                best_len, best_end = k, len(current) - 1 - i + k
+            if k == len(pattern):
+                k = fail[k - 1]
+
+        if best_len < min(STREAM_MIN_OVERLAP_WORDS, len(pattern)):
+            return None
+        return best_end
+
+    @staticmethod
+    def _similar(a, b):
+        """Whether two normalized words are one word, possibly revised"""
+        if a == b:
+            return True
+        if min(len(a), len(b)) < 3:
+            return False
+        return a.startswith(b) or b.startswith(a) or levenshtein(a, b) <= 1
+
+    def _revised_overlap_end(self, current):
+        """Like _overlap_end, but lets a quarter of the typed words differ"""
+        tail = list(self.words)[-STREAM_REVISED_WORDS:]
+        best_count, best_end = 0, None
+        for end in range(1, len(current) + 1):
+            k = min(len(tail), end)
+            count = sum(map(self._similar, current[end - k : end], tail[len(tail) - k :]))
+            if count >= k - k // 4 and count > best_count:
+                best_count, best_end = count, end
+        if best_count < min(STREAM_MIN_OVERLAP_WORDS, len(tail)):
+            return None
+        return best_end
+
+    def commit(self, text):
+        """Record a transcription block and return the part not yet typed"""
+        tokens = [(word, _normalize_word(word)) for word in text.split()]
+        tokens = [token for token in tokens if token[1]]
+        current = [norm for _, norm in tokens]
+        now = time.monotonic()
+
+        if not self.words or now - self.last_commit > STREAM_WINDOW_MS / 1000:
+            # Nothing typed that could still be inside the audio window
+            start = 0
+        else:
+            start = self._overlap_end(current)
+
+        if start is None:
+            start = self._revised_overlap_end(current)
+            if start is not None:
+                logger.info("Stream: typed words were revised, resyncing after them")
+                self.words.clear()
+                self.words.extend(current)
+                self.last_commit = now
+                return " ".join(word for word, _ in tokens[start:])
+
+            # Whisper rewrote the window; resync to it and only type the last
+            # sentence, which is the part most likely to be new (all of it if
+            # there is just one, rather than lose new speech)
+            logger.info("Stream: no overlap with typed text, resyncing")
+            self.words.clear()
+            self.words.extend(current)
+            self.last_commit = now
+            sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+            return sentences[-1]
+
+        new = tokens[start:]
+        self.words.extend(norm for _, norm in new)
+        self.last_commit = now
+        return " ".join(word for word, _ in new)
+
+
+class StreamSession:
+    """Runs whisper-stream and types each new piece of text it produces
+
+    on_exit(session, returncode) is called if whisper-stream quits without
+    stop() having been called.
+    """
+
+    def __init__(self, cmd, type_text, on_exit):
+        self.cmd = cmd
+        self.type_text = type_text
+        self.on_exit = on_exit
+        self.committed = CommittedText()
+        self.process = None
+        self.stopping = False
+
+    def start(self):
+        with open(STREAM_LOG, "ab") as log:
+            self.process = subprocess.Popen(
+                self.cmd,
+                stdout=subprocess.PIPE,
+                stderr=log,
+                text=True,
+                bufsize=1,
+            )
+        threading.Thread(target=self._read_output, daemon=True).start()
+
+    def stop(self):
+        self.stopping = True
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def _read_output(self):
+        block = None
+        for line in self.process.stdout:
+            line = line.replace("\x1b[2K", "").replace("\r", "").strip()
+            if line.startswith("### Transcription") and line.endswith("START"):
+                block = []
+            elif line.startswith("### Transcription") and line.endswith("END"):
+                if block:
+                    self._handle_block(" ".join(block))
+                block = None
+            elif block is not None and STREAM_TIMESTAMP.match(line):
+                text = STREAM_TIMESTAMP.sub("", line).strip()
+                if text and not NOISE_PATTERN.match(text):
+                    block.append(text)
+        returncode = self.process.wait()
+        logger.info(f"whisper-stream exited with code {returncode}")
+        if not self.stopping:
+            self.on_exit(self, returncode)
+
+    def _handle_block(self, text):
+        new_text = self.committed.commit(text)
+        logger.info(f"Stream block: {len(text)} chars, new: {new_text[:50]!r}")
+        if new_text:
+            self.type_text(new_text + " ")
+
+
 class WhisperDaemon:
     def __init__(
         self,
@@ -55,6 +2022,31 @@ class WhisperDaemon:
         notifications=True,
         server_mode=False,
         vocab_file=None,
+        max_record_seconds=MAX_RECORD_SECONDS,
+        incremental=False,
+        vad=True,
+        stream_model_path=None,
+        queue_size=JOB_QUEUE_SIZE,
+        queue_policy="block",
+        server_backends=1,
+        server_threads=None,
+        server_port=SERVER_PORT,
+        idle_timeout=0,
+        model_cache="prefetch",
+        preroll_ms=0,
+        capture_rate=None,
+        dc_block=False,
+        highpass_hz=0,
+        gain_dbfs=None,
+        metrics_file=None,
+        output_method="auto",
+        paste_threshold=PASTE_THRESHOLD,
+        paste_keys=PASTE_KEYS,
+        prompt_tokens=PROMPT_TOKEN_BUDGET,
+        focus_source=sway_focused_app,
+        correct=False,
+        cache_size=CACHE_SIZE,
+        cache_dir=None,
     ):
         self.model_path = Path(model_path)
         self.whisper_cli = Path(whisper_cli_path)
@@ -63,20 +2055,79 @@ class WhisperDaemon:
         )
         self.notifications = notifications
         self.server_mode = server_mode
-        self.vocab_prompt = self._load_vocab(vocab_file)
+        self.vocab = Vocab(vocab_file, prompt_tokens) if vocab_file else None
+        self.focus_source = focus_source  # () -> focused app name or None
+        self.correct = correct  # Fix misheard vocab terms after inference
+        self.max_record_samples = int(max_record_seconds * SAMPLE_RATE)
+        self.incremental = incremental
+        self.vad = vad
+        self.stream_model_path = (
+            Path(stream_model_path) if stream_model_path else self.model_path
+        )
 
         # State
         self.recording = False
+        # Set by STOP; each recording gets its own, so a recording started
+        # right after STOP can't keep the previous capture running
+        self.record_stop = None
+        self.finalizing = False  # Between STOP and the recording being queued
+        self.timeline = None  # Timeline of the recording in progress
+        self.last_latency = None  # STOP to typed, seconds
+        self.metrics = Metrics(metrics_file)
+        self.output = TextOutput(output_method, paste_threshold, paste_keys)
+        self.cache = TranscriptCache(cache_size, cache_dir) if cache_size else None
+        # Recent dictations as {"segments": [audio, ...], "text": str or None}
+        self.history = collections.deque(maxlen=HISTORY_SIZE)
         self.interrupted = False
-        self.audio_queue = queue.Queue()
-        self.server_socket = None
-        self.whisper_server_process = None
-        self.server_port = 8080
+        # Finished recordings, transcribed and typed strictly in order by
+        # a single worker
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.queue_policy = queue_policy
+        self.queue_lock = threading.Lock()
+        self.current_job = None
+        self.ipc_server = None
+        self.loop = None  # asyncio loop serving IPC
+        self.stopping = None  # asyncio.Event set to shut the loop down
+        self.subscribers = set()  # Writers that sent SUBSCRIBE
+        self.backends = None  # BackendPool in server mode
+        self.server_backends = server_backends
+        self.server_threads = server_threads or max(
+            1, (os.cpu_count() or 4) // server_backends
+        )
+        self.server_port = server_port
+        # Server mode: unload the model after idle_timeout seconds without
+        # use (0 = never) and load it again on the next START
+        self.idle_timeout = idle_timeout
+        self.last_activity = time.monotonic()
+        self.warmup_thread = None
+        self.loading = False  # Server model load in progress
+        self.load_failed = False  # The last server model load failed
+        self.warmup_started = None
+        # CLI mode: prefetch the model at START, or keep it resident
+        self.model_cache = model_cache
+        self.model_mapping = None
+        self.http = None  # Keep-alive session to whisper-server
+        self.stream = None  # Active StreamSession
+        self.batch_thread = None
+        self.switch_lock = threading.Lock()  # Held while a model swap runs
+        # Single worker so segments of one recording are transcribed in order
+        self.segment_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="segment"
+        )
+
+        # Microphone rate (None: the device's native rate) and per-block cleanup
+        self.capture_rate = capture_rate
+        self.dc_block = dc_block
+        self.highpass_hz = highpass_hz
+        self.gain_dbfs = gain_dbfs
+
+        # Always-on input with pre-roll (None: open the mic per recording).
+        # Opened by _startup, once the socket is already answering
+        self.preroll_ms = preroll_ms
+        self.preroll_input = None
 
         # Audio feedback
-        self.start_sound = None
-        self.stop_sound = None
-        self.preload_sounds()
+        self.cues = CuePlayer()
 
         # Signal handling
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -85,79 +2136,76 @@ class WhisperDaemon:
         logger.info("Whisper daemon initialized")
         logger.info(f"Model: {self.model_path}")
         logger.info(f"Whisper CLI: {self.whisper_cli}")
-        if self.vocab_prompt:
-            logger.info(f"Vocab prompt loaded ({len(self.vocab_prompt)} chars)")
-
-    def _load_vocab(self, vocab_file):
-        """Load vocabulary prompt from file"""
-        if not vocab_file:
-            return None
 
-        vocab_path = Path(vocab_file)
-        if not vocab_path.exists():
-            logger.warning(f"Vocab file not found: {vocab_path}")
-            return None
-
-        try:
-            with open(vocab_path, "r") as f:
-                # Read lines, strip comments and whitespace, join with commas
-                words = []
-                for line in f:
-                    line = line.split("#")[0].strip()  # Remove comments
-                    if line:
-                        words.extend([w.strip() for w in line.split(",") if w.strip()])
-                prompt = ", ".join(words)
-                logger.info(f"Loaded {len(words)} vocab words from {vocab_path}")
-                return prompt
-        except Exception as e:
-            logger.error(f"Failed to load vocab file: {e}")
+    def _vocab_prompt(self, context=False):
+        """Prompt from the vocab file, for the focused app if context is set"""
+        if not self.vocab:
             return None
+        app = self.focus_source() if context and self.focus_source else None
+        return self.vocab.prompt(app)
 
     def _signal_handler(self, signum, frame):
-        """Handle shutdown signals"""
+        """Handle shutdown signals
+
+        Once the event loop is serving this only tells _serve to stop;
+        start() cleans up after asyncio.run returns. Before that nothing is
+        mid-callback, so exit straight away.
+        """
         logger.info("Received shutdown signal")
         self.interrupted = True
-        if self.server_socket:
-            self.server_socket.close()
-        if self.whisper_server_process:
+        if self.stopping:
+            self.stopping.set()
+        else:
+            sys.exit(0)
+
+    def _shutdown(self):
+        """Release the stream, audio devices, server pool and output"""
+        self.loop = None  # Closed; later events have nowhere to go
+        if self.stream:
+            self.stop_stream()
+        self.cues.close()
+        if self.preroll_input:
+            self.preroll_input.close()
+        if self.backends:
             logger.info("Stopping whisper server...")
-            self.whisper_server_process.terminate()
-            self.whisper_server_process.wait(timeout=5)
-        sys.exit(0)
+            self.backends.stop()
+        self.output.close()
 
     def preload_sounds(self):
-        """Preload audio feedback sounds into memory"""
+        """Preload audio feedback sounds, converted to the output device's rate"""
+        start_file = self.sound_dir / "snare.wav"
+        stop_file = self.sound_dir / "hihat.wav"
+        if not start_file.exists() and not stop_file.exists():
+            return
+
         try:
-            start_file = self.sound_dir / "snare.wav"
-            stop_file = self.sound_dir / "hihat.wav"
+            self.cues.open()
 
             if start_file.exists():
-                _, self.start_sound = wavfile.read(start_file)
+                self.cues.load("start", start_file)
                 logger.info(f"Loaded start sound: {start_file}")
 
             if stop_file.exists():
-                _, self.stop_sound = wavfile.read(stop_file)
+                self.cues.load("stop", stop_file)
                 logger.info(f"Loaded stop sound: {stop_file}")
         except Exception as e:
             logger.warning(f"Could not load sounds: {e}")
 
-    def play_sound(self, sound_data):
-        """Play audio feedback"""
-        if sound_data is not None:
-            try:
-                sd.play(sound_data, 44100)  # Sounds are usually 44.1kHz
-                sd.wait()  # Wait for sound to finish playing
-            except Exception as e:
-                logger.warning(f"Could not play sound: {e}")
+    def play_sound(self, name):
+        """Play audio feedback ("start" or "stop") without waiting for it"""
+        try:
+            self.cues.play(name)
+        except Exception as e:
+            logger.warning(f"Could not play sound: {e}")
 
     def notify(self, message, urgency="normal"):
         """Show desktop notification"""
         if not self.notifications:
             return
         try:
-            subprocess.run(
-                ["notify-send", "-u", urgency, "🎤 Whisper", message, "-t", "2000"],
-                timeout=1,
+            # Not waited on, so a slow notification daemon never delays us
+            subprocess.Popen(
+                ["notify-send", "-u", urgency, "🎤 Whisper", message, "-t", "2000"]
             )
         except Exception as e:
             logger.warning(f"Could not show notification: {e}")
@@ -167,19 +2215,45 @@ class WhisperDaemon:
         if self.recording:
             logger.warning("Already recording")
             return "ALREADY_RECORDING"
+        if self.stream:
+            logger.warning("Streaming, not starting a recording")
+            return "STREAMING"
 
+        self.timeline = Timeline()
+        self.timeline.mark("keypress")
         self.recording = True
+        self.record_stop = threading.Event()
         Path(RECORDING_FLAG).touch()
+        self.last_activity = time.monotonic()
+
+        # Load an unloaded server model while the user is speaking
+        model_state = None
+        if self.server_mode:
+            model_state = "warm" if self.backends else "cold"
+            if model_state == "cold":
+                logger.info("Model unloaded, loading it while recording")
+                self._prewarm()
+        elif self.model_cache != "off":
+            # whisper-cli reads the model after STOP; get it into memory now
+            threading.Thread(
+                target=prefetch_file, args=(self.model_path,), daemon=True
+            ).start()
+
+        # Start recording thread first so capture isn't delayed by the cue
+        threading.Thread(
+            target=self._record_audio,
+            args=(self.record_stop, model_state, self.timeline),
+            daemon=True,
+        ).start()
 
         # Play start sound
-        self.play_sound(self.start_sound)
+        self.play_sound("start")
 
         # Show notification
         self.notify("Recording started... Press SUPER+D to stop")
 
-        # Start recording thread
-        threading.Thread(target=self._record_audio, daemon=True).start()
-
+        if self.recording:  # The microphone may already have failed
+            self.emit("recording")
         logger.info("Recording started")
         return "RECORDING"
 
@@ -189,78 +2263,465 @@ class WhisperDaemon:
             logger.warning("Not recording")
             return "NOT_RECORDING"
 
+        self.finalizing = True
+        self.timeline.mark("stop")
         self.recording = False
+        self.record_stop.set()
         Path(RECORDING_FLAG).unlink(missing_ok=True)
 
         # Play stop sound
-        self.play_sound(self.stop_sound)
+        self.play_sound("stop")
+        self.cues.report()
 
         # Show notification
         self.notify("Recording stopped - transcribing...")
+        self.emit("processing")
 
         logger.info("Recording stopped")
         return "STOPPED"
 
-    def _record_audio(self):
-        """Record audio in background thread"""
+    def start_stream(self):
+        """Start live streaming transcription with whisper-stream"""
+        if self.stream:
+            logger.warning("Already streaming")
+            return "ALREADY_STREAMING"
+        if self.recording:
+            logger.warning("Recording, not starting a stream")
+            return "ALREADY_RECORDING"
+
+        stream_bin = self.whisper_cli.parent / "whisper-stream"
+        if not stream_bin.exists():
+            logger.error(f"whisper-stream not found at {stream_bin}")
+            return "ERROR"
+
+        cmd = [
+            str(stream_bin),
+            "-m",
+            str(self.stream_model_path),
+            "--step",
+            "0",  # VAD mode: transcribe after each pause
+            "--length",
+            str(STREAM_WINDOW_MS),
+            "--keep",
+            "200",
+            "-vth",
+            "0.6",
+            "-t",
+            str(os.cpu_count() or 4),
+        ]
+        Path(STREAMING_FLAG).touch()
+        self.play_sound("start")
+
+        self.stream = StreamSession(cmd, self._type_text, self._stream_exited)
+        # Before starting, so an immediate exit's event arrives after this one
+        self.emit("streaming")
+        self.stream.start()
+        logger.info(f"Streaming started ({self.stream_model_path.name})")
+        return "STREAMING"
+
+    def stop_stream(self):
+        """Stop live streaming transcription"""
+        if not self.stream:
+            logger.warning("Not streaming")
+            return "NOT_STREAMING"
+
+        self.stream.stop()
+        self.stream = None
+        Path(STREAMING_FLAG).unlink(missing_ok=True)
+        self.play_sound("stop")
+
+        self.emit("ready")
+        logger.info("Streaming stopped")
+        return "STREAM_STOPPED"
+
+    def _stream_exited(self, session, returncode):
+        """Clear streaming state after whisper-stream quit on its own"""
+        if self.stream is not session:
+            return
+        self.stream = None
+        Path(STREAMING_FLAG).unlink(missing_ok=True)
+        if returncode:
+            message = f"whisper-stream exited with code {returncode}, see {STREAM_LOG}"
+            logger.error(message)
+            self.notify(message, urgency="critical")
+            self.emit("error", message=message)
+        else:
+            logger.warning("whisper-stream exited, streaming stopped")
+            self.emit("ready")
+
+    def _record_audio(self, stop, model_state=None, timeline=None):
+        """Record audio in background thread until the stop event is set"""
         logger.info("Recording thread started")
-        recorded_chunks = []
+        buffer = AudioBuffer(self.max_record_samples)
+
+        # Segments already sent off for transcription (incremental mode)
+        pending = []
+        segments = []
+        segment_start = 0
+
+        timeline = timeline or Timeline()
+
+        try:
+            # Start recording
+            with self._capture(buffer, stop, timeline):
+                # Picked once the microphone is open, for the app the user is
+                # dictating into: asking sway must not delay capture
+                prompt = self._vocab_prompt(context=True)
+                # Keep recording until stopped
+                while not stop.wait(0.1):
+                    if not self.incremental:
+                        continue
+                    cut = self._find_segment_cut(buffer, segment_start)
+                    if cut:
+                        segment = buffer.view(segment_start, cut)
+                        logger.info(
+                            f"Sending {len(segment) / SAMPLE_RATE:.1f}s segment early"
+                        )
+                        pending.append(
+                            self.segment_executor.submit(
+                                self._transcribe, segment, prompt=prompt
+                            )
+                        )
+                        segments.append(segment)
+                        segment_start = cut
+
+            if buffer.dropped:
+                logger.warning(
+                    f"Recording hit the {self.max_record_samples / SAMPLE_RATE:.0f}s cap, "
+                    f"dropped {buffer.dropped / SAMPLE_RATE:.1f}s of audio"
+                )
+
+            # Process recorded audio
+            if len(buffer):
+                job = TranscriptionJob(buffer.view(segment_start), pending, model_state)
+                job.segments = segments + job.segments
+                job.prompt = prompt
+                job.timeline = timeline
+                timeline.mark("queued")
+                self._submit_job(job)
+                self.finalizing = False
+            else:
+                self.finalizing = False
+                logger.warning("No audio recorded")
+                self.emit("ready")
+        except Exception as e:
+            # The device could not be opened or failed mid-recording
+            logger.error(f"Recording failed: {e}")
+            for future in pending:
+                future.cancel()
+            stop.set()
+            if self.record_stop is stop:  # Not already replaced by a new START
+                self.recording = False
+                self.finalizing = False
+                Path(RECORDING_FLAG).unlink(missing_ok=True)
+            self.notify(f"Recording failed: {e}", urgency="critical")
+            self.emit("error", message=f"Recording failed: {e}")
+        finally:
+            self.finalizing = False
+
+    @contextlib.contextmanager
+    def _capture(self, buffer, stop, timeline):
+        """Route microphone audio into buffer until the block exits or stop is set"""
+        if self.preroll_input:
+            self.preroll_input.begin(buffer)
+            timeline.mark("capture_start")
+            try:
+                yield
+            finally:
+                self.preroll_input.end(buffer)
+            return
+
+        conditioner = self._input_conditioner()
 
         def audio_callback(indata, frames, time, status):
             if status:
                 logger.warning(f"Audio callback status: {status}")
-            if self.recording:
-                recorded_chunks.append(indata.copy())
+            if not stop.is_set():
+                timeline.mark("capture_start")
+                buffer.write(conditioner.process(indata))
 
-        # Start recording
         with sd.InputStream(
-            samplerate=SAMPLE_RATE,
+            samplerate=conditioner.rate,
             channels=CHANNELS,
             callback=audio_callback,
-            dtype="int16",
+            dtype=conditioner.dtype,
         ):
-            # Keep recording until stopped
-            while self.recording:
-                sd.sleep(100)
-
-        # Process recorded audio
-        if recorded_chunks:
-            audio_data = np.concatenate(recorded_chunks, axis=0)
-            self._transcribe_and_type(audio_data)
-        else:
-            logger.warning("No audio recorded")
+            yield
 
-    def _transcribe_and_type(self, audio_data):
-        """Transcribe audio and type the result"""
-        logger.info(f"Transcribing {len(audio_data) / SAMPLE_RATE:.1f}s of audio")
+    def _input_conditioner(self):
+        """A fresh conditioner for a new input stream, at the capture rate"""
+        rate = self.capture_rate
+        if rate is None:
+            try:
+                rate = int(sd.query_devices(kind="input")["default_samplerate"])
+            except Exception as e:
+                logger.warning(f"Could not query the input device's rate: {e}")
+                rate = SAMPLE_RATE
+        return InputConditioner(rate, self.dc_block, self.highpass_hz, self.gain_dbfs)
+
+    def _submit_job(self, job):
+        """Queue a recording for transcription according to the queue policy"""
+        if self.queue_policy == "block":
+            self.jobs.put(job)
+            return
 
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            temp_file = tmp.name
-            wavfile.write(temp_file, SAMPLE_RATE, audio_data)
+        with self.queue_lock:
+            try:
+                self.jobs.put_nowait(job)
+                return
+            except queue.Full:
+                pass
+
+            if self.queue_policy == "reject":
+                logger.warning(f"Transcription queue full, dropping job {job.id}")
+                job.cancel()
+                if job.text is None:
+                    self.history.append(
+                        {"segments": job.segments, "prompt": job.prompt, "text": None}
+                    )
+                self.notify("Transcription queue full - dictation dropped", "critical")
+                return
+
+            # drop-oldest: make room by discarding the longest-waiting job
+            try:
+                oldest = self.jobs.get_nowait()
+                oldest.cancel()
+                if oldest.text is None:
+                    self.history.append(
+                        {"segments": oldest.segments, "prompt": oldest.prompt, "text": None}
+                    )
+                self.jobs.task_done()
+                logger.warning(f"Transcription queue full, dropped job {oldest.id}")
+            except queue.Empty:
+                pass
+            self.jobs.put_nowait(job)
+
+    def _transcription_worker(self):
+        """Transcribe and type queued recordings one at a time, in order"""
+        while True:
+            job = self.jobs.get()
+            self.current_job = job
+            try:
+                if job.model_state:
+                    logger.info(f"Job {job.id}: model was {job.model_state} at START")
+                job.timeline.mark("dequeued")
+                if job.text is not None:
+                    # Already in the history; only typed again
+                    if not job.cancelled.is_set():
+                        logger.info(f"Replaying: {job.text[:50]}...")
+                        self._type_text(job.text)
+                        self.emit("typed", text=job.text, replay=True)
+                    continue
+                text = event = None
+                if not job.cancelled.is_set():
+                    text, event = self._transcribe_and_type(
+                        job.audio_data, job.pending, job.cancelled, job.timeline, job.prompt
+                    )
+                    self._record_metrics(job.timeline)
+                self.history.append(
+                    {"segments": job.segments, "prompt": job.prompt, "text": text}
+                )
+                # Only now, so a client reacting to it can already REPLAY the
+                # dictation and read its timings from METRICS
+                if event:
+                    name, fields = event
+                    self.emit(name, **fields)
+            finally:
+                self.last_activity = time.monotonic()
+                self.current_job = None
+                self.jobs.task_done()
+                if not self.recording and not self.jobs.unfinished_tasks:
+                    self.emit("ready")
+
+    def _record_metrics(self, timeline):
+        """Log a finished dictation's stage timings and add them to metrics"""
+        latency = timeline.between("stop", "typed")
+        if latency is not None:
+            self.last_latency = latency
+        mode = timeline.backend or ("server" if self.server_mode else "cli")
+        self.metrics.record(timeline, model_name(self.model_path), mode)
+        stages = ", ".join(
+            f"{stage} {seconds * 1000:.0f}ms"
+            for stage, start, end in STAGES
+            if (seconds := timeline.between(start, end)) is not None
+        )
+        if stages:
+            logger.info(f"Timings: {stages}")
+
+    def cancel_job(self):
+        """Abort the transcription in flight
+
+        whisper-cli is killed; a request already sent to whisper-server runs
+        to completion on its backend and only its result is discarded.
+        """
+        job = self.current_job
+        if job is None:
+            return "NOTHING_TO_CANCEL"
+
+        job.cancel()
+        logger.info(f"Cancelled job {job.id}")
+        return "CANCELLED"
+
+    def _find_segment_cut(self, buffer, segment_start):
+        """Return a sample index to cut the live recording at, or None
+
+        A cut is placed in the middle of a trailing pause, once the current
+        segment is long enough to be worth sending on its own.
+        """
+        end = len(buffer)
+        pause = int(SEGMENT_PAUSE_SECONDS * SAMPLE_RATE)
+        if end - segment_start < SEGMENT_MIN_SECONDS * SAMPLE_RATE:
+            return None
+
+        window = buffer.view(end - pause, end).astype(np.float32)
+        rms = np.sqrt(np.mean(window * window))
+        if rms >= SEGMENT_SILENCE_RMS:
+            return None
+        return end - pause // 2
+
+    def _gate_speech(self, audio_data):
+        """Trim silence before inference; returns None if there is no speech"""
+        if not self.vad:
+            return audio_data
+
+        trimmed = trim_silence(audio_data)
+        before = len(audio_data) / SAMPLE_RATE
+        if trimmed is None:
+            logger.info(f"VAD: no speech in {before:.1f}s of audio, skipping model")
+            return None
+
+        after = len(trimmed) / SAMPLE_RATE
+        saved = 100 * (1 - after / before) if before else 0
+        logger.info(f"VAD: {before:.1f}s -> {after:.1f}s ({saved:.0f}% trimmed)")
+        return trimmed
+
+    def _transcribe(self, audio_data, cancelled=None, timeline=None, prompt=None):
+        """Transcribe audio, answering from the cache when it was seen before
+
+        prompt defaults to the vocab prompt without app context. Failures
+        raise and are never cached, so transcribing again retries them.
+        """
+        if prompt is None:
+            prompt = self._vocab_prompt()
+        key = None
+        if self.cache:
+            key = self.cache.key(audio_data, self.model_path, prompt, self.vad)
+            text = self.cache.get(key)
+            if text is not None:
+                logger.info("Transcript cache hit")
+                return self._correct(text)
+
+        text = self._run_model(audio_data, cancelled, timeline, prompt)
+        if key and not (cancelled and cancelled.is_set()):
+            self.cache.put(key, text)
+        return self._correct(text)
+
+    def _correct(self, text):
+        """Fix vocab terms whisper misheard (next JS -> Next.js)"""
+        if not (self.correct and self.vocab and text):
+            return text
+        text, corrections = self.vocab.correct(text)
+        for heard, term in corrections:
+            logger.info(f"Corrected {heard!r} -> {term!r}")
+        return text
+
+    def _run_model(self, audio_data, cancelled=None, timeline=None, prompt=None):
+        """Transcribe audio with the active backend and return the text"""
+        timeline = timeline or Timeline()
+        timeline.mark("transcribing")
+        audio_data = self._gate_speech(audio_data)
+        timeline.mark("speech_gated")
+        if audio_data is None:
+            return ""
+        timeline.audio_seconds = len(audio_data) / SAMPLE_RATE
+
+        text = None
+        if self.server_mode and self._wait_for_server(timeline.audio_seconds):
+            timeline.mark("backend_ready")
+            timeline.backend = "server"
+            # Server mode never touches disk: encode and upload from memory
+            wav_data = encode_wav(audio_data)
+            timeline.mark("encoded")
+            text = self._transcribe_server(wav_data, prompt, timeline.audio_seconds)
+            if text is None:
+                logger.warning("Server transcription failed, retrying with whisper-cli")
+        if text is None:
+            timeline.mark("backend_ready")
+            timeline.backend = "cli"
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+                temp_file = tmp.name
+                tmp.write(encode_wav(audio_data))
+            timeline.mark("encoded")
+            try:
+                text = self._transcribe_cli(temp_file, cancelled, prompt)
+            finally:
+                os.unlink(temp_file)
+        timeline.mark("inferred")
+
+        if NOISE_PATTERN.match(text):
+            logger.info(f"Dropping non-speech transcription: {text}")
+            return ""
+        return text
+
+    def _transcribe_and_type(
+        self, audio_data, pending=(), cancelled=None, timeline=None, prompt=None
+    ):
+        """Transcribe audio and type the result; returns (text, event)
+
+        text is None when the transcription failed or was cancelled. event is
+        the (name, fields) to emit once the caller has recorded the dictation.
+        pending holds futures for earlier segments of the same recording that
+        incremental mode already sent off; each is typed, in order, as soon
+        as it is ready, so typing overlaps with transcribing the rest.
+        Nothing more is typed once the cancelled event is set.
+        """
+        logger.info(f"Transcribing {len(audio_data) / SAMPLE_RATE:.1f}s of audio")
 
         try:
-            if self.server_mode:
-                text = self._transcribe_server(temp_file)
-            else:
-                text = self._transcribe_cli(temp_file)
+            parts = []
+            for future in pending:
+                part = future.result()
+                if cancelled and cancelled.is_set():
+                    break
+                if part:
+                    self._type_text(f" {part}" if parts else part)
+                    parts.append(part)
+
+            text = ""
+            if len(audio_data) and not (cancelled and cancelled.is_set()):
+                text = self._transcribe(audio_data, cancelled, timeline, prompt)
+
+            if cancelled and cancelled.is_set():
+                logger.info("Transcription cancelled, not typing")
+                return None, ("cancelled", {})
 
+            if text:
+                self._type_text(f" {text}" if parts else text)
+                parts.append(text)
+            text = " ".join(parts)
             if text:
                 logger.info(f"Transcribed: {text[:50]}...")
-                self._type_text(text)
+                if timeline:
+                    timeline.mark("typed")
                 self.notify(f"Typed: {text[:40]}...", urgency="low")
-            else:
-                logger.warning("No speech detected")
-                self.notify("No speech detected", urgency="critical")
-
+                return text, ("typed", {"text": text})
+            logger.warning("No speech detected")
+            self.notify("No speech detected", urgency="critical")
+            return text, ("no_speech", {})
+
+        except concurrent.futures.CancelledError:
+            logger.info("Transcription cancelled, not typing")
+            return None, ("cancelled", {})
         except Exception as e:
             logger.error(f"Transcription error: {e}")
-        finally:
-            # Clean up
-            os.unlink(temp_file)
+            return None, ("error", {"message": str(e)})
+
+    def _transcribe_cli(self, audio_file, cancelled=None, prompt=None):
+        """Transcribe using whisper-cli (loads model each time)
 
-    def _transcribe_cli(self, audio_file):
-        """Transcribe using whisper-cli (loads model each time)"""
+        The process is killed if the cancelled event is set while it runs.
+        Raises RuntimeError if whisper-cli fails.
+        """
         cmd = [
             str(self.whisper_cli),
             "-m",
@@ -272,14 +2733,30 @@ class WhisperDaemon:
         ]
 
         # Add vocab prompt if available
-        if self.vocab_prompt:
-            cmd.extend(["--prompt", self.vocab_prompt])
+        if prompt:
+            cmd.extend(["--prompt", prompt])
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=0.1)
+                break
+            except subprocess.TimeoutExpired:
+                if cancelled and cancelled.is_set():
+                    process.kill()
+                    process.communicate()
+                    return ""
+                if time.monotonic() > deadline:
+                    process.kill()
+                    process.communicate()
+                    raise
 
         # Extract transcription
-        if result.returncode == 0:
-            lines = result.stdout.strip().split("\n")
+        if process.returncode == 0:
+            lines = stdout.strip().split("\n")
             text_lines = [
                 line.strip()
                 for line in lines
@@ -290,54 +2767,209 @@ class WhisperDaemon:
             ]
             return " ".join(text_lines).strip()
         else:
-            logger.error(f"Transcription failed: {result.stderr}")
-            return ""
+            logger.error(f"Transcription failed: {stderr}")
+            message = f"whisper-cli exited with code {process.returncode}"
+            if stderr.strip():
+                message += f": {stderr.strip().splitlines()[-1]}"
+            raise RuntimeError(message)
+
+    def _transcribe_server(self, wav_data, prompt=None, audio_seconds=0.0):
+        """Transcribe using whisper-server (model stays in memory)
+
+        wav_data is a complete WAV file as bytes, as produced by encode_wav().
+        Returns None if the server failed, so the caller can use whisper-cli.
+        """
+        files = {"file": ("audio.wav", wav_data, "audio/wav")}
+        data = {
+            "temperature": "0.0",
+            "temperature_inc": "0.2",
+            "response_format": "json",
+        }
+
+        # Add vocab prompt if available
+        if prompt:
+            data["prompt"] = prompt
 
-    def _transcribe_server(self, audio_file):
-        """Transcribe using whisper-server (model stays in memory)"""
+        # Read once: a model swap or MODE cli may replace the pool at any time
+        backends = self.backends
+        if backends is None:
+            logger.warning("whisper-server was stopped")
+            return None
+        slow_after = max(SERVER_SLOW_SECONDS, audio_seconds * SERVER_SLOW_RTF)
+        backend = None
+        started = time.monotonic()
         try:
-            with open(audio_file, "rb") as f:
-                files = {"file": ("audio.wav", f, "audio/wav")}
-                data = {
-                    "temperature": "0.0",
-                    "temperature_inc": "0.2",
-                    "response_format": "json",
-                }
-
-                # Add vocab prompt if available
-                if self.vocab_prompt:
-                    data["prompt"] = self.vocab_prompt
-
-                response = requests.post(
-                    f"http://127.0.0.1:{self.server_port}/inference",
+            with backends.acquire() as backend:
+                if backend is None:
+                    logger.warning("No healthy whisper-server")
+                    backends.report(None, False)
+                    return None
+                response = self.http.post(
+                    f"{backend.url}/inference",
                     files=files,
                     data=data,
-                    timeout=30,
+                    timeout=max(SERVER_REQUEST_TIMEOUT, slow_after),
                 )
-
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("text", "").strip()
-                else:
-                    logger.error(f"Server returned status {response.status_code}")
-                    return ""
+            response.raise_for_status()
+            text = response.json().get("text", "").strip()
         except Exception as e:
             logger.error(f"Server transcription error: {e}")
-            return ""
+            if not backends.stopping.is_set():  # Not our own shutdown's fault
+                backends.report(backend, False)
+            return None
+
+        elapsed = time.monotonic() - started
+        slow = elapsed > slow_after
+        if slow:
+            logger.warning(
+                f"whisper-server took {elapsed:.1f}s for {audio_seconds:.1f}s of audio"
+            )
+        backends.report(backend, not slow, slow=slow)
+        return text
 
     def _type_text(self, text):
-        """Type text using wtype"""
+        """Send text to the focused window (typed with wtype, or pasted)"""
         try:
-            subprocess.run(["wtype", "-"], input=text, text=True, check=True, timeout=5)
-            logger.info("Text typed successfully")
+            self.output.send(text)
         except FileNotFoundError:
             logger.error("wtype not found - install it for auto-typing")
         except Exception as e:
             logger.error(f"Typing error: {e}")
 
+    def start_batch(self, pattern, output=None):
+        """Transcribe a directory or glob of audio files in the background"""
+        if self.batch_thread and self.batch_thread.is_alive():
+            return "BATCH_RUNNING"
+
+        files = find_audio_files(pattern)
+        if not files:
+            return "NO_FILES"
+        if output is None:
+            base = Path(pattern).expanduser()
+            output = (base if base.is_dir() else base.parent) / BATCH_OUTPUT
+        output = Path(output)
+        try:
+            open(output, "a").close()
+        except OSError as e:
+            logger.error(f"Batch: can't write results to {output}: {e}")
+            return "ERROR"
+
+        self.batch_thread = threading.Thread(
+            target=self._run_batch, args=(files, output), daemon=True
+        )
+        self.batch_thread.start()
+        return f"BATCH_STARTED {len(files)}"
+
+    def _run_batch(self, files, output):
+        """Transcribe files in parallel, appending one JSON line per file
+
+        Files that already have a successful result in the output file are
+        skipped, so an interrupted batch resumes where it stopped. If the
+        batch itself fails (e.g. the output file becomes unwritable), it is
+        logged and reported as an error event.
+        """
+        try:
+            done = set()
+            if output.exists():
+                with open(output) as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                            if "error" not in record:
+                                done.add(record["file"])
+                        except (json.JSONDecodeError, TypeError, KeyError):
+                            # A partial line from an interrupted run, or not ours
+                            continue
+            todo = [f for f in files if str(f) not in done]
+            logger.info(
+                f"Batch: {len(todo)} files to transcribe ({len(files) - len(todo)} done)"
+            )
+
+            workers = len(self.backends) if self.server_mode and self.backends else 1
+            started = time.monotonic()
+            with open(output, "a") as out, concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="batch"
+            ) as executor:
+                futures = [executor.submit(self._transcribe_file, f) for f in todo]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        out.write(json.dumps(future.result()) + "\n")
+                        out.flush()
+                except Exception:
+                    for future in futures:
+                        future.cancel()  # Results could not be saved anyway
+                    raise
+            logger.info(
+                f"Batch: finished {len(todo)} files in {time.monotonic() - started:.1f}s"
+            )
+        except Exception as e:
+            logger.error(f"Batch failed: {e}")
+            self.notify(f"Batch failed: {e}", urgency="critical")
+            self.emit("error", message=f"Batch failed: {e}")
+
+    def _transcribe_file(self, path):
+        """Transcribe one audio file for a batch; returns its JSONL record
+
+        A file that couldn't be decoded or transcribed gets an "error"
+        instead of "text", so the next run of the batch retries it.
+        """
+        record = {"file": str(path)}
+        started = time.monotonic()
+        try:
+            audio_data = load_audio(path)
+            loaded = time.monotonic()
+            record["text"] = self._transcribe(audio_data)
+            record["audio_seconds"] = round(len(audio_data) / SAMPLE_RATE, 3)
+            record["load_seconds"] = round(loaded - started, 3)
+            record["transcribe_seconds"] = round(time.monotonic() - loaded, 3)
+        except Exception as e:
+            logger.error(f"Batch: {path}: {e}")
+            record["error"] = str(e)
+        record["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        return record
+
+    def replay(self, index=1):
+        """Type a recent dictation again (1 = the last one)
+
+        It is queued like a recording, so it is typed after the dictations
+        ahead of it, never in the middle of one. If it never produced text (error, cancel), its audio is queued for
+        transcription again; segments that did finish come from the cache.
+        One that was transcribed but held no speech has nothing to type.
+        """
+        if self.recording:
+            return "RECORDING"
+        if not 1 <= index <= len(self.history):
+            return "NOTHING_TO_REPLAY"
+
+        entry = self.history[-index]
+        if entry["text"] == "":
+            return "NO_SPEECH"
+        if entry["text"] is not None:
+            # Through the queue, so it is never typed into the middle of
+            # another dictation's text
+            job = TranscriptionJob(np.zeros(0, dtype=np.int16))
+            job.text = entry["text"]
+            self._submit_job(job)
+            return "REPLAYED"
+
+        *segments, tail = entry["segments"]
+        prompt = entry["prompt"]
+        pending = [
+            self.segment_executor.submit(self._transcribe, s, prompt=prompt)
+            for s in segments
+        ]
+        job = TranscriptionJob(tail, pending)
+        job.segments = entry["segments"]
+        job.prompt = prompt
+        job.timeline.mark("queued")
+        self._submit_job(job)
+        self.emit("processing")
+        return "RETRANSCRIBING"
+
     def handle_command(self, command):
         """Handle IPC command"""
-        command = command.strip().upper()
+        command, _, argument = command.strip().partition(" ")
+        command = command.upper()
 
         if command == "START":
             return self.start_recording()
@@ -345,129 +2977,676 @@ class WhisperDaemon:
             return self.stop_recording()
         elif command == "STATUS":
             return "RECORDING" if self.recording else "READY"
+        elif command == "INFO":
+            return self.status_snapshot()
+        elif command == "METRICS":
+            return self.metrics.snapshot()
         elif command == "TOGGLE":
             if self.recording:
                 return self.stop_recording()
             else:
                 return self.start_recording()
+        elif command == "CANCEL":
+            return self.cancel_job()
+        elif command in ("REPLAY", "RETYPE"):
+            if argument.strip() and not argument.strip().isdigit():
+                return "USAGE: REPLAY [n]"
+            return self.replay(int(argument.strip() or 1))
+        elif command == "MODEL":
+            if not argument:
+                return "USAGE: MODEL <name|path>"
+            return self.switch_model(model=argument.strip())
+        elif command == "MODE":
+            mode, _, model = argument.strip().partition(" ")
+            if mode.lower() not in ("cli", "server"):
+                return "USAGE: MODE <cli|server> [model]"
+            return self.switch_model(
+                model=model.strip() or None, server_mode=mode.lower() == "server"
+            )
+        elif command == "BATCH":
+            args = shlex.split(argument)
+            if not 1 <= len(args) <= 2:
+                return "USAGE: BATCH <dir|glob> [output.jsonl]"
+            return self.start_batch(*args)
+        elif command == "STREAM_START":
+            return self.start_stream()
+        elif command == "STREAM_STOP":
+            return self.stop_stream()
         else:
             return "UNKNOWN_COMMAND"
 
-    def handle_client(self, client_socket):
-        """Handle client connection"""
+    def status_snapshot(self):
+        """Everything a status display needs, in one dict"""
+        if self.stream:
+            phase = "streaming"
+        elif self.recording:
+            phase = "recording"
+        elif self.finalizing or self.jobs.unfinished_tasks:
+            phase = "processing"
+        else:
+            phase = "ready"
+        backend = self.backend_state()
+        return {
+            "phase": phase,
+            "mode": "server" if self.server_mode else "cli",
+            "model": model_name(self.model_path),
+            "stream_model": model_name(self.stream_model_path),
+            "model_loaded": bool(self.backends) if self.server_mode else None,
+            "backend": backend,
+            "ready_in": (
+                round(self._load_remaining(), 1) if backend == "loading" else None
+            ),
+            "switching": self.switch_lock.locked() and not self.loading,
+            "queue_depth": self.jobs.unfinished_tasks,
+            "last_latency": (
+                round(self.last_latency, 3) if self.last_latency is not None else None
+            ),
+        }
+
+    def backend_state(self):
+        """ready, recovering, loading, unloaded or failed; whisper-cli is always ready"""
+        if not self.server_mode:
+            return "ready"
+        if self.backends:
+            # Recovering: dictations go through whisper-cli meanwhile
+            return "ready" if self.backends.healthy else "recovering"
+        if self.loading:
+            return "loading"
+        return "failed" if self.load_failed else "unloaded"
+
+    def emit(self, event, **fields):
+        """Push a state-change event to SUBSCRIBE'd clients (thread-safe)
+
+        Every event carries a full status snapshot, so subscribers never need
+        a follow-up request.
+        """
+        if self.loop is None or not self.subscribers:
+            return
+        message = {
+            "event": event,
+            "time": round(time.time(), 3),
+            **fields,
+            "status": self.status_snapshot(),
+        }
+        data = (json.dumps(message) + "\n").encode()
+        self.loop.call_soon_threadsafe(self._broadcast, data)
+
+    def _broadcast(self, data):
+        for writer in list(self.subscribers):
+            if (
+                writer.is_closing()
+                or writer.transport.get_write_buffer_size() > SUBSCRIBER_BUFFER_LIMIT
+            ):
+                self.subscribers.discard(writer)
+                writer.close()
+                continue
+            writer.write(data)
+
+    async def _run_command(self, command):
+        # Commands may block briefly (process startup/shutdown), so keep them
+        # off the event loop; awaiting keeps pipelined replies in order
+        return await self.loop.run_in_executor(None, self.handle_command, command)
+
+    async def _adopt(self, conn):
+        """Handle a connection the EarlyResponder accepted but left unread"""
         try:
-            data = client_socket.recv(1024).decode()
-            response = self.handle_command(data)
-            client_socket.send(response.encode())
+            reader, writer = await asyncio.open_unix_connection(sock=conn)
+        except OSError:
+            conn.close()
+            return
+        await self.handle_client(reader, writer)
+
+    async def handle_client(self, reader, writer):
+        """Handle client connection
+
+        Plain-text clients (ncat, the shell scripts) send one command and get
+        a bare reply before the connection closes. Clients whose first byte is
+        "{" speak newline-delimited JSON on a persistent connection and may
+        pipeline requests or SUBSCRIBE to state-change events.
+        """
+        try:
+            data = await reader.read(1024)
+            if not data.lstrip().startswith(b"{"):
+                response = await self._run_command(data.decode())
+                if not isinstance(response, str):
+                    response = json.dumps(response)
+                writer.write(response.encode())
+                await writer.drain()
+                return
+
+            while True:
+                *lines, data = data.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        await self._handle_request(line, writer)
+                if len(data) > MAX_REQUEST_BYTES:
+                    logger.warning("Client request too long, closing connection")
+                    return
+                more = await reader.read(MAX_REQUEST_BYTES)
+                if not more:
+                    if data.strip():
+                        await self._handle_request(data, writer)
+                    return
+                data += more
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # Client went away, or the daemon is shutting down
         except Exception as e:
             logger.error(f"Client handling error: {e}")
         finally:
-            client_socket.close()
+            self.subscribers.discard(writer)
+            writer.close()
 
-    def _start_whisper_server(self):
-        """Start whisper-server subprocess"""
-        if not self.server_mode:
-            return
+    async def _handle_request(self, line, writer):
+        """Answer one JSON request: {"id": ..., "cmd": "STATUS", "args": ...}"""
+        try:
+            request = json.loads(line)
+            command = str(request["cmd"]).upper()
+        except (ValueError, KeyError, TypeError):
+            response = {"error": "expected {\"cmd\": ..., \"args\": ...}"}
+        else:
+            response = {"id": request["id"]} if "id" in request else {}
+            args = request.get("args")
+            if isinstance(args, list):
+                args = shlex.join(str(arg) for arg in args)
+            if command == "SUBSCRIBE":
+                self.subscribers.add(writer)
+                response["result"] = "SUBSCRIBED"
+            elif command == "UNSUBSCRIBE":
+                self.subscribers.discard(writer)
+                response["result"] = "UNSUBSCRIBED"
+            else:
+                full = f"{command} {args}" if args else command
+                response["result"] = await self._run_command(full)
+        writer.write((json.dumps(response) + "\n").encode())
+        await writer.drain()
 
+    def _launch_pool(self, model_path, base_port):
+        """Start whisper-server backends for a model and wait until they answer
+
+        Returns the ready BackendPool, or None if the servers could not start.
+        """
         if not HAS_REQUESTS:
             logger.error(
                 "Server mode requires 'requests' library. Install with: uv pip install requests"
             )
-            logger.info("Falling back to CLI mode")
-            self.server_mode = False
-            return
+            return None
 
-        # Start whisper-server
         server_bin = self.whisper_cli.parent / "whisper-server"
         if not server_bin.exists():
             logger.error(f"whisper-server not found at {server_bin}")
-            logger.info("Falling back to CLI mode")
-            self.server_mode = False
+            return None
+
+        # Split the CPU cores between the backends
+        pool = BackendPool(
+            server_bin,
+            model_path,
+            self.server_backends,
+            base_port,
+            self.server_threads,
+            on_change=lambda: self.emit("backend_health"),
+        )
+        started = time.monotonic()
+        pool.start()
+
+        # Persistent session so each dictation reuses the same TCP connection
+        if self.http is None:
+            self.http = requests.Session()
+
+        # Wait for server to be ready
+        if pool.wait_ready(self.http):
+            logger.info(
+                f"Whisper server started successfully ({model_path.name}, "
+                f"{len(pool)} backend(s), {self.server_threads} threads each)"
+            )
+            # Timed, so dictations made during the next load can tell how
+            # long it will take
+            self.metrics.observe(
+                "model_load", model_name(model_path), "server", time.monotonic() - started
+            )
+            pool.supervise()
+            return pool
+
+        logger.error("Whisper server failed to start")
+        pool.stop(timeout=0)
+        return None
+
+    def _start_whisper_server(self):
+        """Start whisper-server, falling back to CLI mode if it won't come up"""
+        if not self.server_mode:
             return
 
-        # Use all available CPU cores for threading
-        import os
+        # Through _prewarm, so a dictation started meanwhile waits on this load
+        self._prewarm()
+        self.warmup_thread.join()
+        if self.backends is None and self.server_mode:
+            logger.info("Falling back to CLI mode")
+            self.server_mode = False
 
-        num_threads = os.cpu_count() or 4
+    def _hold_model(self):
+        """Keep the current model file mapped and resident in memory"""
+        try:
+            mapping = map_resident(self.model_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not keep model resident: {e}")
+            return
+        old, self.model_mapping = self.model_mapping, mapping
+        if old:
+            old.close()
+        logger.info(f"Holding {self.model_path.name} resident ({len(mapping) >> 20} MB)")
+
+    def _prewarm(self):
+        """Start loading the server model in the background if it's unloaded"""
+        if self.warmup_thread and self.warmup_thread.is_alive():
+            return
+        self.loading = True
+        self.warmup_started = time.monotonic()
+        self.warmup_thread = threading.Thread(target=self._warm_up, daemon=True)
+        self.warmup_thread.start()
 
-        cmd = [
-            str(server_bin),
-            "--model",
-            str(self.model_path),
-            "--host",
-            "127.0.0.1",
-            "--port",
-            str(self.server_port),
-            "--threads",
-            str(num_threads),
-            "--processors",
-            "1",  # Keep at 1 - this is for parallel inference, not CPU cores
-            "--no-timestamps",
-        ]
+    def _warm_up(self):
+        try:
+            with self.switch_lock:
+                if not self.server_mode or self.backends is not None:
+                    return
+                self.load_failed = False
+                self.emit("model_loading", ready_in=round(self._load_remaining(), 1))
+                self.backends = self._launch_pool(self.model_path, self.server_port)
+                self.load_failed = self.backends is None
+        finally:
+            self.loading = False
+        if self.backends:
+            logger.info(f"Model loaded in {time.monotonic() - self.warmup_started:.1f}s")
+            self.emit("model_loaded")
+        else:
+            self.emit("error", message="Model failed to load")
 
-        logger.info(f"Starting whisper-server on port {self.server_port}...")
-        self.whisper_server_process = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    def _expected_load_seconds(self):
+        """Server model load time: as measured before, else guessed from its size"""
+        measured = self.metrics.median(
+            "stage", "model_load", model_name(self.model_path), "server"
         )
-
-        # Wait for server to be ready
-        max_wait = 30  # seconds
-        start_time = time.time()
-        while time.time() - start_time < max_wait:
-            try:
-                response = requests.get(
-                    f"http://127.0.0.1:{self.server_port}/", timeout=1
+        if measured is not None:
+            return measured
+        try:
+            return self.model_path.stat().st_size / MODEL_LOAD_RATE
+        except OSError:
+            return 0.0
+
+    def _load_remaining(self):
+        """Expected seconds until the loading server model is ready"""
+        elapsed = time.monotonic() - self.warmup_started if self.warmup_started else 0
+        expected = self._expected_load_seconds()
+        if elapsed > expected:
+            # Overrunning, so the estimate is off: assume it needs as long again
+            return elapsed
+        return expected - elapsed
+
+    def _predicted_inference(self, mode, audio_seconds):
+        rtf = self.metrics.median("rtf", "inference", model_name(self.model_path), mode)
+        return rtf * audio_seconds if rtf is not None else None
+
+    def _cli_is_faster(self, audio_seconds):
+        """Whether whisper-cli would finish before the loading server does"""
+        server = self._predicted_inference("server", audio_seconds) or 0.0
+        cli = self._predicted_inference("cli", audio_seconds)
+        if cli is None:
+            # whisper-cli loads the same model itself, on every run
+            cli = self._expected_load_seconds() + server
+        return cli < self._load_remaining() + server
+
+    def _wait_for_server(self, audio_seconds=0.0):
+        """Wait for an in-progress model load; False if whisper-cli should be used
+
+        Audio recorded while the model loads is held until it is ready,
+        unless whisper-cli is expected to get the text out sooner.
+        """
+        if self.backends is None:
+            retrying = self.load_failed
+            self._prewarm()
+            if retrying:
+                logger.info("Model failed to load last time, using whisper-cli while it retries")
+                return False
+            if self._cli_is_faster(audio_seconds):
+                logger.info(
+                    f"Model still loading (~{self._load_remaining():.1f}s left), "
+                    f"whisper-cli is faster for this dictation"
                 )
-                if response.status_code in [200, 404]:  # Server is responding
-                    logger.info("Whisper server started successfully")
+                return False
+            started = time.monotonic()
+            self.warmup_thread.join()
+            logger.info(f"Held the dictation {time.monotonic() - started:.1f}s for the model")
+        if self.backends is None:
+            logger.warning("Server unavailable, using whisper-cli for this dictation")
+            return False
+        if not self.backends.healthy or not self.backends.breaker.allow():
+            logger.info("whisper-server unavailable, using whisper-cli for this dictation")
+            return False
+        return True
+
+    def _idle_monitor(self):
+        """Unload the server model after idle_timeout seconds without use"""
+        while not self.interrupted:
+            time.sleep(min(self.idle_timeout / 4, 30))
+            idle = time.monotonic() - self.last_activity
+            busy = (
+                self.recording
+                or self.jobs.unfinished_tasks
+                or (self.batch_thread and self.batch_thread.is_alive())
+            )
+            if not self.backends or busy or idle < self.idle_timeout:
+                continue
+            if not self.switch_lock.acquire(blocking=False):
+                continue
+            try:
+                pool, self.backends = self.backends, None
+                logger.info(f"Idle for {idle:.0f}s, unloading {self.model_path.name}")
+                pool.drain()
+                pool.stop()
+            finally:
+                self.switch_lock.release()
+            self.emit("model_unloaded")
+
+    def _resolve_model(self, name):
+        """Model path for a name like "base.en", or a path to a .bin file"""
+        path = Path(name).expanduser()
+        if path.suffix == ".bin" or len(path.parts) > 1:
+            return path if path.is_absolute() else self.model_path.parent / path
+        return self.model_path.parent / f"ggml-{name}.bin"
+
+    def switch_model(self, model=None, server_mode=None):
+        """Switch model and/or CLI/server mode without interrupting dictation
+
+        The new backend is started next to the old one; traffic moves over
+        once it answers and the old backend is drained and stopped.
+        """
+        model_path = self._resolve_model(model) if model else self.model_path
+        if not model_path.exists():
+            logger.error(f"Model not found: {model_path}")
+            return "MODEL_NOT_FOUND"
+        if server_mode is None:
+            server_mode = self.server_mode
+        if model_path == self.model_path and server_mode == self.server_mode:
+            return "UNCHANGED"
+
+        if not self.switch_lock.acquire(blocking=False):
+            return "SWITCH_IN_PROGRESS"
+        threading.Thread(
+            target=self._switch_backend, args=(model_path, server_mode), daemon=True
+        ).start()
+        self.emit("switching")
+        return "SWITCHING"
+
+    def _switch_backend(self, model_path, server_mode):
+        """Bring up the new backend, then move traffic over to it"""
+        mode = None
+        try:
+            old = self.backends
+            new = None
+            if server_mode:
+                # Use the other port range so both pools can run side by side
+                base_port = self.server_port
+                if old and old.base_port == self.server_port:
+                    base_port += self.server_backends
+                new = self._launch_pool(model_path, base_port)
+                if new is None:
+                    logger.error(f"Switch failed, keeping {self.model_path.name}")
+                    self.notify("Model switch failed", urgency="critical")
                     return
-            except requests.exceptions.RequestException:
-                time.sleep(0.5)
 
-        logger.error("Whisper server failed to start")
-        logger.info("Falling back to CLI mode")
-        self.server_mode = False
-        if self.whisper_server_process:
-            self.whisper_server_process.kill()
-            self.whisper_server_process = None
+            # Ordered so a concurrent transcription never sees server mode
+            # without a pool
+            self.model_path = model_path
+            if server_mode:
+                self.backends = new
+                self.server_mode = True
+            else:
+                self.server_mode = False
+                self.backends = None
+            mode = "server" if server_mode else "CLI"
+            logger.info(f"Switched to {model_path.name} ({mode} mode)")
+            if self.model_cache == "resident" and not server_mode:
+                self._hold_model()
+            elif self.model_mapping:
+                # whisper-server keeps its own copy of the model
+                self.model_mapping.close()
+                self.model_mapping = None
+            self.notify(f"Switched to {model_path.name} ({mode} mode)", "low")
+
+            if old:
+                if not old.drain():
+                    logger.warning("Old whisper-server still busy, stopping anyway")
+                old.stop()
+        finally:
+            self.switch_lock.release()
+        if mode:
+            self.emit("model", model=model_name(model_path), mode=mode.lower())
+        else:
+            self.emit("error", message="Model switch failed")
 
     def start(self):
         """Start the daemon"""
         logger.info("Starting Whisper daemon...")
 
-        # Start whisper server if in server mode
-        self._start_whisper_server()
+        threading.Thread(target=self._transcription_worker, daemon=True).start()
+        if self.idle_timeout:
+            threading.Thread(target=self._idle_monitor, daemon=True).start()
+
+        # Bind first and answer status polls until the event loop is up
+        listener, activated = listening_socket()
+        early = EarlyResponder(listener, self.handle_command)
+
+        # Main loop
+        try:
+            asyncio.run(self._serve(listener, activated, early))
+        finally:
+            self._shutdown()
 
-        # Remove existing socket
-        if os.path.exists(SOCKET_PATH):
-            os.unlink(SOCKET_PATH)
+    def _startup(self):
+        """Open audio devices and load the model, after IPC is already up
+
+        Commands are answered meanwhile; a recording started before the
+        pre-roll stream is open opens the microphone itself, as without
+        --preroll-ms.
+        """
+        started = time.monotonic()
+        if self.preroll_ms:
+            try:
+                preroll_input = PrerollInput(
+                    int(self.preroll_ms * SAMPLE_RATE / 1000), self._input_conditioner()
+                )
+                preroll_input.open()
+                self.preroll_input = preroll_input
+                logger.info(f"Microphone kept open with {self.preroll_ms:.0f} ms pre-roll")
+            except Exception as e:
+                logger.error(f"Could not open the microphone for pre-roll: {e}")
+
+        self.preload_sounds()
+        logger.info(f"Audio ready {time.monotonic() - started:.2f}s after listening")
 
-        # Create Unix socket
-        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self.server_socket.bind(SOCKET_PATH)
-        self.server_socket.listen(5)
+        if self.vocab:
+            prompt = self.vocab.prompt()
+            logger.info(f"Vocab prompt: {len(prompt or '')} chars")
 
-        logger.info(f"Daemon listening on {SOCKET_PATH}")
+        if self.model_cache == "resident" and not self.server_mode:
+            self._hold_model()
+        self._start_whisper_server()
+
+    async def _serve(self, listener, activated, early):
+        """Serve IPC on the Unix socket until shutdown
+
+        Takes over from the EarlyResponder: connections it left unread are
+        handled here like any other.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        # Shut down between callbacks, never halfway through serving a client
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.loop.add_signal_handler(signum, self._signal_handler, signum, None)
+
+        options = {}
+        if activated and sys.version_info >= (3, 13):
+            # systemd owns the socket file and keeps it across restarts
+            options["cleanup_socket"] = False
+        deferred = early.stop()
+        self.ipc_server = await asyncio.start_unix_server(
+            self.handle_client, sock=listener, **options
+        )
+        # Held here so the tasks aren't garbage-collected while they run
+        adopted = [asyncio.create_task(self._adopt(conn)) for conn in deferred]
+        logger.info(
+            f"Daemon listening on {SOCKET_PATH}"
+            + (" (socket-activated)" if activated else "")
+        )
+        if early.answered or adopted:
+            logger.info(
+                f"{early.answered} requests answered and {len(adopted)} held "
+                "while the event loop started"
+            )
+
+        threading.Thread(target=self._startup, name="startup", daemon=True).start()
         logger.info(
             f"Mode: {'SERVER (model in memory)' if self.server_mode else 'CLI (load model each time)'}"
         )
         logger.info("Ready for commands")
 
-        # Main loop
-        while not self.interrupted:
+        # Not serve_forever: on close it waits for every client to hang up,
+        # and the waybar module never does. asyncio.run cancels the handlers
+        await self.stopping.wait()
+        self.ipc_server.close()
+
+
+def listening_socket():
+    """The bound IPC socket and whether systemd passed it in"""
+    sock = activation_socket()
+    if sock:
+        return sock, True
+    # Remove existing socket
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(SOCKET_PATH)
+    sock.listen(100)
+    return sock, False
+
+
+class EarlyResponder:
+    """Answers status polls on the IPC socket while the event loop starts
+
+    Importing asyncio alone takes longer than the rest of startup. This
+    thread answers the read-only EARLY_COMMANDS from plain-text clients in
+    the meantime; any other connection is left unread for the event loop,
+    so it sees the request as if it had accepted it itself.
+    """
+
+    def __init__(self, listener, handle_command):
+        self.listener = listener
+        self.handle_command = handle_command
+        self.deferred = []  # Accepted connections for the event loop
+        self.answered = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="early-ipc", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop accepting; returns the connections left for the event loop"""
+        self.stopping.set()
+        self.thread.join()
+        return self.deferred
+
+    def _run(self):
+        while not self.stopping.is_set():
+            ready, _, _ = select.select([self.listener], [], [], 0.01)
+            if not ready:
+                continue
             try:
-                client_socket, _ = self.server_socket.accept()
-                # Handle in thread for non-blocking
-                threading.Thread(
-                    target=self.handle_client, args=(client_socket,), daemon=True
-                ).start()
+                conn, _ = self.listener.accept()
             except OSError:
-                if not self.interrupted:
-                    logger.error("Socket error")
-                break
+                continue
+            try:
+                if self._answer(conn):
+                    self.answered += 1
+                    conn.close()
+                    continue
+            except OSError:
+                conn.close()
+                continue
+            conn.settimeout(None)
+            self.deferred.append(conn)
+
+    def _answer(self, conn):
+        """Reply to a lone early command; False leaves the request unread"""
+        conn.settimeout(EARLY_READ_TIMEOUT)
+        try:
+            data = conn.recv(1024, socket.MSG_PEEK)
+        except TimeoutError:
+            return False
+        command = data.decode(errors="replace").strip().upper()
+        if command not in EARLY_COMMANDS:
+            return False
+        conn.recv(len(data))
+        response = self.handle_command(command)
+        if not isinstance(response, str):
+            response = json.dumps(response)
+        conn.sendall(response.encode())
+        return True
+
+
+def activation_socket():
+    """The listening socket systemd passed in (socket activation), or None"""
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return None
+    if int(os.environ.get("LISTEN_FDS", "0")) < 1:
+        return None
+    # Consumed here, so whisper-server and other children don't inherit them
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+    return socket.socket(fileno=SD_LISTEN_FDS_START)
+
+
+def send_command(command):
+    """Send one command to the running daemon and return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(SOCKET_PATH)
+        sock.send(command.encode())
+        return sock.recv(1024).decode()
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def transcribe_main(argv):
+    """`whisper_daemon.py transcribe`: batch-transcribe files via the daemon"""
+    parser = argparse.ArgumentParser(
+        prog="whisper_daemon.py transcribe",
+        description="Transcribe a directory or glob of audio files with the "
+        "running daemon's model; results are appended to a JSONL file",
+    )
+    parser.add_argument("path", help="Directory of audio files or a glob pattern")
+    parser.add_argument(
+        "--output", "-o", help=f"JSONL results file (default: <dir>/{BATCH_OUTPUT})"
+    )
+    args = parser.parse_args(argv)
+
+    # The daemon may run in another directory, so send absolute paths
+    command = ["BATCH", os.path.abspath(os.path.expanduser(args.path))]
+    if args.output:
+        command.append(os.path.abspath(args.output))
+    try:
+        print(send_command(shlex.join(command)))
+    except OSError as e:
+        print(f"Daemon not running ({e})", file=sys.stderr)
+        sys.exit(1)
 
 
 def main():
+    if sys.argv[1:2] == ["transcribe"]:
+        return transcribe_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description="Whisper Daemon")
     parser.add_argument(
         "--model", "-m", default="models/ggml-base.en.bin", help="Path to whisper model"
@@ -497,6 +3676,152 @@ def main():
         "-v",
         help="Path to vocabulary file with tech terms to improve recognition",
     )
+    parser.add_argument(
+        "--max-record-seconds",
+        type=float,
+        default=MAX_RECORD_SECONDS,
+        help=f"Maximum length of a single recording (default: {MAX_RECORD_SECONDS})",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Transcribe finished sentences at pauses while still recording",
+    )
+    parser.add_argument(
+        "--server-backends",
+        type=positive_int,
+        default=1,
+        help="Number of whisper-server processes in server mode (default: 1)",
+    )
+    parser.add_argument(
+        "--server-threads",
+        type=int,
+        help="Threads per whisper-server (default: CPU cores / backends)",
+    )
+    parser.add_argument(
+        "--server-port",
+        type=int,
+        default=SERVER_PORT,
+        help=f"Port of the first whisper-server (default: {SERVER_PORT})",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=0,
+        help="Server mode: unload the model after this many idle seconds and "
+        "reload it when recording starts (default: 0, never unload)",
+    )
+    parser.add_argument(
+        "--model-cache",
+        choices=MODEL_CACHE_POLICIES,
+        default="prefetch",
+        help="CLI mode: 'prefetch' reads the model into the page cache when "
+        "recording starts, 'resident' keeps it mapped while the daemon runs "
+        "(default: prefetch)",
+    )
+    parser.add_argument(
+        "--preroll-ms",
+        type=float,
+        default=0,
+        help="Keep the microphone open and prepend this many ms of audio from "
+        "before START to each recording (default: 0, open the mic per recording)",
+    )
+    parser.add_argument(
+        "--capture-rate",
+        type=int,
+        help="Open the microphone at this rate (default: the device's native "
+        "rate, resampled to 16 kHz by the daemon)",
+    )
+    parser.add_argument(
+        "--dc-block",
+        action="store_true",
+        help="Remove DC offset from the microphone signal",
+    )
+    parser.add_argument(
+        "--highpass",
+        type=float,
+        default=0,
+        metavar="HZ",
+        help="High-pass filter the microphone signal at HZ, e.g. 80 against rumble "
+        "(default: 0, off)",
+    )
+    parser.add_argument(
+        "--normalize",
+        type=float,
+        metavar="DBFS",
+        help="Slowly adjust gain towards this speech level, e.g. -20 (default: off)",
+    )
+    parser.add_argument(
+        "--output-method",
+        choices=OUTPUT_METHODS,
+        default="auto",
+        help="How text reaches the focused window: auto (default) types short "
+        "transcripts and pastes long ones, type always types, paste always pastes",
+    )
+    parser.add_argument(
+        "--paste-threshold",
+        type=int,
+        default=PASTE_THRESHOLD,
+        help=f"Characters from which auto mode pastes (default: {PASTE_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--paste-keys",
+        default=PASTE_KEYS,
+        help=f"Paste shortcut, e.g. ctrl+shift+v for terminals (default: {PASTE_KEYS})",
+    )
+    parser.add_argument(
+        "--prompt-tokens",
+        type=int,
+        default=PROMPT_TOKEN_BUDGET,
+        help="Token budget for the vocab prompt; terms for the focused app are "
+        f"picked first (default: {PROMPT_TOKEN_BUDGET})",
+    )
+    parser.add_argument(
+        "--correct",
+        action="store_true",
+        help="Fix misheard vocab terms in transcripts",
+    )
+    parser.add_argument(
+        "--focus-command",
+        help="Command printing the focused app's name, for picking vocab "
+        "(default: ask swaymsg)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHE_SIZE,
+        help=f"Transcripts cached in memory by audio hash (default: {CACHE_SIZE}, 0 disables)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Also keep cached transcripts in this directory, across restarts",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="Write latency histograms to this file in Prometheus text format "
+        "(e.g. for node_exporter's textfile collector)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=positive_int,
+        default=JOB_QUEUE_SIZE,
+        help=f"Maximum recordings waiting for transcription (default: {JOB_QUEUE_SIZE})",
+    )
+    parser.add_argument(
+        "--queue-policy",
+        choices=QUEUE_POLICIES,
+        default="block",
+        help="What to do with a new recording when the queue is full (default: block)",
+    )
+    parser.add_argument(
+        "--stream-model",
+        help="Path to whisper model for stream mode (default: same as --model)",
+    )
+    parser.add_argument(
+        "--no-vad",
+        action="store_true",
+        help="Send recordings to whisper untrimmed (disable silence trimming)",
+    )
 
     args = parser.parse_args()
 
@@ -521,6 +3846,10 @@ def main():
             vocab_path = script_dir / vocab_path
         vocab_file = vocab_path
 
+    stream_model = None
+    if args.stream_model:
+        stream_model = script_dir / args.stream_model
+
     # Start daemon
     daemon = WhisperDaemon(
         model_path=model_path,
@@ -529,6 +3858,35 @@ def main():
         notifications=not args.no_notifications,
         server_mode=args.server_mode,
         vocab_file=vocab_file,
+        max_record_seconds=args.max_record_seconds,
+        incremental=args.incremental,
+        vad=not args.no_vad,
+        stream_model_path=stream_model,
+        queue_size=args.queue_size,
+        queue_policy=args.queue_policy,
+        server_backends=args.server_backends,
+        server_threads=args.server_threads,
+        server_port=args.server_port,
+        idle_timeout=args.idle_timeout,
+        model_cache=args.model_cache,
+        preroll_ms=args.preroll_ms,
+        capture_rate=args.capture_rate,
+        dc_block=args.dc_block,
+        highpass_hz=args.highpass,
+        gain_dbfs=args.normalize,
+        metrics_file=args.metrics_file,
+        output_method=args.output_method,
+        paste_threshold=args.paste_threshold,
+        paste_keys=args.paste_keys,
+        prompt_tokens=args.prompt_tokens,
+        correct=args.correct,
+        focus_source=(
+            command_focus_source(args.focus_command)
+            if args.focus_command
+            else sway_focused_app
+        ),
+        cache_size=args.cache_size,
+        cache_dir=args.cache_dir,
     )
     daemon.start()
 